@@ -2,13 +2,28 @@
 Blackjack game class file.
 '''
 
+from array import array
 import random
 import bj_errors
 
+# The cards a Shoe deals, by code: code // 4 is the rank (0 for an ace up to 12 for a king),
+# code % 4 is the suit. Ranks use the same labels and values as Deck.
+SUITS = ['♠', '♦', '♥', '♣']
+RANKS = [('A', 11), ('2', 2),  ('3', 3), ('4', 4), ('5', 5),
+         ('6', 6),  ('7', 7),  ('8', 8), ('9', 9), ('10', 10),
+         ('J', 10), ('Q', 10), ('K', 10)]
+CODE_VALUES = [RANKS[code // 4][1] for code in range(52)]
+
+# The most cards one round can take (a hand can't get past 21 on fewer than about a dozen
+# low cards, one each for player and dealer), so a shoe's cut card always leaves this many.
+MAX_ROUND_CARDS = 24
+
 class Card():
     '''
-    Describes a playing card.
+    Describes a playing card. Slotted, since simulations go through a lot of these.
     '''
+    __slots__ = ('suit', 'rank')
+
     def __init__(self, suit, rank):
         '''
         Constructor for Card.
@@ -24,22 +39,29 @@ class Card():
         return self.rank[0] + self.suit
 
 
+# One Card per code, made up front. Cards never change once made, so a Shoe can hand out
+# these same objects over and over instead of building a new one for every deal.
+CARDS = [Card(SUITS[code % 4], RANKS[code // 4]) for code in range(52)]
+
+
 class Deck():
     '''
     Describes a deck of playing cards
     '''
-    def __init__(self):
+    def __init__(self, rng = None):
         '''
         Constructor for Deck.
-        Creates 52 cards and shuffles them.
+        Creates 52 cards and shuffles them, with rng (a random.Random) if given so the
+        deal can be repeated, or else the random module's own generator.
         '''
+        rng = rng or random
         suits = ['♠', '♦', '♥', '♣']
         ranks = [('A', 11), ('2', 2),  ('3', 3), ('4', 4), ('5', 5), 
                  ('6', 6),  ('7', 7),  ('8', 8), ('9', 9), ('10', 10),
                  ('J', 10), ('Q', 10), ('K', 10)]
         
-        random.shuffle(suits)
-        random.shuffle(ranks)
+        rng.shuffle(suits)
+        rng.shuffle(ranks)
                  
         cards = []
 
@@ -47,7 +69,7 @@ class Deck():
             for r in ranks:
                 cards.append(Card(s, r))
 
-        random.shuffle(cards)
+        rng.shuffle(cards)
 
         self.cards = cards
 
@@ -73,6 +95,176 @@ class Deck():
         return self.cards.pop(0)
 
 
+class Shoe():
+    '''
+    Describes a dealing shoe of 1 to 8 decks, for when building and shuffling a Deck of Card
+    objects every round is too slow (i.e., simulations).
+
+    Cards are stored as one byte each (see the card codes at the top) and dealt by moving an
+    index along, never by removing anything from a list. The shuffle is done as the cards
+    are dealt: each deal swaps a random one of the cards still in the shoe into the next
+    spot and hands that out. Every order comes out exactly as likely as with random.shuffle,
+    but reshuffling is instant, since it only means starting again from the top.
+
+    A cut card goes in at penetration (the fraction of the shoe dealt before reshuffling);
+    needs_shuffle() says when it's been reached, which the game checks between rounds.
+    penetration = 0 reshuffles before every round, like blackjack.py's fresh Deck. It always
+    leaves at least MAX_ROUND_CARDS behind it, so a round never runs out of cards.
+    '''
+    def __init__(self, decks = 1, penetration = 0.75, seed = None, rng = None):
+        '''
+        Constructor for Shoe. The shuffle comes from rng (a random.Random) if given, or else
+        a new one seeded with seed, so the same seed always deals the same cards.
+        '''
+        if not 1 <= decks <= 8:
+            raise ValueError('A shoe holds 1 to 8 decks.')
+
+        self.decks = decks
+        self.cards = array('B', range(52)) * decks
+        self.cut = max(0, min(int(penetration * len(self.cards)),
+                              len(self.cards) - MAX_ROUND_CARDS))
+        self.rng = rng or random.Random(seed)
+        self.shuffle()
+
+
+    def __str__(self):
+        '''
+        Define text output for Shoe.
+        '''
+        return f'{self.decks}-deck shoe, {len(self)} cards left'
+
+
+    def __len__(self):
+        '''
+        How many cards are left to deal.
+        '''
+        return len(self.cards) - self.position
+
+
+    def shuffle(self):
+        '''
+        Puts every card back in the shoe. (The actual shuffling happens as they're dealt.)
+        '''
+        self.position = 0
+        self.rank_counts = [4 * self.decks] * 13
+
+
+    def needs_shuffle(self):
+        '''
+        Whether the cut card has come out.
+        '''
+        return self.position >= self.cut
+
+
+    def deal_code(self):
+        '''
+        Deals one card, as its code.
+        '''
+        cards = self.cards
+        position = self.position
+        if position == len(cards): # only if nobody's been watching for the cut card
+            self.shuffle()
+            position = 0
+        i = position + int(self.rng.random() * (len(cards) - position))
+
+        code = cards[i]
+        cards[i] = cards[position]
+        cards[position] = code
+
+        self.position = position + 1
+        self.rank_counts[code >> 2] -= 1
+        return code
+
+
+    def deal_card(self):
+        '''
+        Deals one card as a Card, so a Shoe can stand in for a Deck.
+        '''
+        return CARDS[self.deal_code()]
+
+
+    def remaining(self, value):
+        '''
+        How many cards of a given value (11 for aces, 10 for tens and faces, and so on) are
+        left in the shoe.
+        '''
+        if value == 10:
+            return sum(self.rank_counts[9:])
+        return self.rank_counts[0 if value == 11 else value - 1]
+
+
+class Hand():
+    '''
+    Describes the cards someone is holding, keeping the value up to date as each card
+    arrives instead of adding them all up again every time.
+
+    The value follows the game's rule (see Player.get_hand_val): aces count 11, and if the
+    hand is over 21 ONE ace drops to 1. So all a hand needs to remember is its total with
+    every ace at 11 and whether it has an ace at all.
+    '''
+    __slots__ = ('cards', 'total', 'has_ace')
+
+    def __init__(self, cards = ()):
+        '''
+        Constructor for Hand.
+        '''
+        self.cards = []
+        self.total = 0
+        self.has_ace = False
+
+        for c in cards:
+            self.add(c)
+
+
+    def __str__(self):
+        '''
+        Define text output for Hand.
+        '''
+        return ', '.join(str(c) for c in self.cards)
+
+
+    def __len__(self):
+        '''
+        How many cards are in the hand.
+        '''
+        return len(self.cards)
+
+
+    def add(self, card):
+        '''
+        Adds a Card.
+        '''
+        self.cards.append(card)
+        self.total += card.rank[1]
+        if card.rank[1] == 11:
+            self.has_ace = True
+
+
+    def add_code(self, code):
+        '''
+        Adds a card by its code (see the card codes at the top), as dealt by Shoe.deal_code.
+        '''
+        self.add(CARDS[code])
+
+
+    @property
+    def value(self):
+        '''
+        What the hand is worth.
+        '''
+        if self.total > 21 and self.has_ace:
+            return self.total - 10
+        return self.total
+
+
+    @property
+    def soft(self):
+        '''
+        Whether an ace is still being counted as 11.
+        '''
+        return self.has_ace and self.total <= 21
+
+
 # It occurs to me that the Dealer can probably also be of Player() class, and just
 # ignore the payroll bit, and operate according to different logic in the game area.
 # Course solution was to just create a Hand object instead, but they had no recurring
@@ -83,13 +275,21 @@ class Player():
     '''
     def __init__(self):
         '''
-        Constructor for Player. Gives them a starting bankroll and a card list.
+        Constructor for Player. Gives them a starting bankroll and an empty Hand.
         '''
         self.bankroll = 100
-        self.cards = []
+        self.hand = Hand()
         self.hand_val = 0
 
 
+    @property
+    def cards(self):
+        '''
+        The cards in the player's hand.
+        '''
+        return self.hand.cards
+
+
     def __str__(self):
         '''
         Define text output for Player.
@@ -126,26 +326,17 @@ class Player():
         '''
         Calculate hand value. Will account for the existence of Aces.
         '''
-        val = 0
-        hasAce = False
-
-        for c in self.cards:
-            val += c.rank[1] # Add number
-
-            if not hasAce: # If an Ace hasn't already been flagged...
-                hasAce = (c.rank[0] == 'A') # Test for an Ace.
-
-        if val > 21 and hasAce: # If we're over 21 but we have an Ace...
-            val -= 10           # Get rid of one Ace's worth of abiguity.
-
-        self.hand_val = val
+        # The Hand has been keeping count as cards came in, so there's no need to go back
+        # over them all. If we're over 21 but we have an Ace, it's already gotten rid of
+        # one Ace's worth of abiguity.
+        self.hand_val = self.hand.value
 
 
     def deal_first_cards(self, cards):
         '''
         Sets the first two cards for the start of the hand.
         '''
-        self.cards = cards
+        self.hand = Hand(cards)
         self.get_hand_val()
 
 
@@ -153,5 +344,5 @@ class Player():
         '''
         Adds another card and updates hand value.
         '''
-        self.cards.append(new_card)
+        self.hand.add(new_card)
         self.get_hand_val()
\ No newline at end of file
@@ -0,0 +1,540 @@
+'''
+Blackjack headless simulation engine.
+
+Plays rounds with exactly the rules blackjack.py uses, but without any of the screen
+clearing, pauses, or prompts, so a computer "player" can get through millions of them:
+
+    import bj_engine
+    stats = bj_engine.simulate(1000000, bj_engine.hit_below(17), seed = 1)
+    print(stats)
+
+The rules, as blackjack.py (and bj_classes.Player.get_hand_val) play them:
+
+    - Every round is dealt from a fresh, shuffled 52-card deck. (simulate can also deal
+      from a multi-deck shoe instead.)
+    - Aces count 11, unless the hand is over 21, in which case ONE ace drops to 1.
+    - A 21 on the first two cards is a blackjack and ends the round: both have one, push;
+      otherwise whoever has it wins.
+    - The player hits until they stand, bust (and lose), or reach 21 (and stand).
+    - The dealer hits on 17 or less and stands on 18 or more.
+    - Higher total wins; equal totals push.
+    - The bet is paid back double on a win, 2.5x on a player blackjack, and returned on a
+      push, so a round is worth +1, +1.5, 0, or -1 bets.
+
+A policy is any function policy(total, soft, dealer_up) that returns True to hit, where
+total is the player's hand value, soft is True if an ace is still being counted as 11, and
+dealer_up is the value of the dealer's face-up card (the first one dealt to them, 2 to 11).
+It has to depend on nothing else, since simulate asks it about every possible situation
+once up front and then just looks the answers up.
+'''
+
+import argparse
+import functools
+import math
+import multiprocessing
+import random
+import time
+import bj_classes
+
+# NumPy is only used by simulate_batch, and it manages without (just slower).
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Round outcomes, from the player's point of view.
+WIN, BLACKJACK, PUSH, LOSS = 0, 1, 2, 3
+
+# What each outcome does to the bankroll, in bets (indexed by outcome).
+PAYOFFS = (1, 1.5, 0, -1)
+
+# How many rounds simulate_batch plays at once. Big enough that NumPy's per-call overhead
+# disappears, small enough that the working arrays stay in cache.
+BATCH_CHUNK = 1 << 14
+
+# How many rounds simulate_parallel hands a worker at a time.
+PARALLEL_CHUNK = 1 << 18
+
+
+##### POLICIES #####
+def never_hit(total, soft, dealer_up):
+    '''
+    Stands on whatever it's dealt.
+    '''
+    return False
+
+
+def hit_below(threshold):
+    '''
+    Returns a policy that hits on anything under threshold. hit_below(18) plays exactly
+    like the dealer.
+    '''
+    def policy(total, soft, dealer_up):
+        return total < threshold
+
+    return policy
+
+
+mimic_dealer = hit_below(18)
+
+
+##### STATISTICS #####
+class Stats():
+    '''
+    Running totals for a batch of rounds.
+    '''
+    def __init__(self, bankroll = 100):
+        '''
+        Constructor for Stats. bankroll is what the player starts with (the same 100 that
+        bj_classes.Player gets).
+        '''
+        self.rounds = 0
+        self.outcomes = [0, 0, 0, 0] # indexed by WIN, BLACKJACK, PUSH, LOSS
+        self.player_busts = 0
+        self.dealer_busts = 0
+        self.dealer_blackjacks = 0
+        self.start_bankroll = bankroll
+        self.bankroll = bankroll
+        self.low_bankroll = bankroll
+        self.high_bankroll = bankroll
+
+
+    def __str__(self):
+        '''
+        Define text output for Stats.
+        '''
+        if not self.rounds:
+            return 'No rounds played.'
+
+        wins, blackjacks, pushes, losses = self.outcomes
+        return (f'{self.rounds:,} rounds: '
+                f'{wins + blackjacks:,} won ({blackjacks:,} with blackjack), '
+                f'{pushes:,} pushed, {losses:,} lost\n'
+                f'Expected return per unit bet: {self.mean():+.4f} '
+                f'(+/- {1.96 * self.std_dev() / math.sqrt(self.rounds):.4f})\n'
+                f'Bankroll: {self.start_bankroll:.2f} -> {self.bankroll:.2f} '
+                f'(low {self.low_bankroll:.2f}, high {self.high_bankroll:.2f})')
+
+
+    def net(self):
+        '''
+        Total won (or lost, if negative) in bets.
+        '''
+        wins, blackjacks, _, losses = self.outcomes
+        return wins + 1.5 * blackjacks - losses
+
+
+    def mean(self):
+        '''
+        Average result per round, in bets (the player's edge; negative means the house's).
+        '''
+        return self.net() / self.rounds if self.rounds else 0.0
+
+
+    def std_dev(self):
+        '''
+        Standard deviation of a single round's result, in bets.
+        '''
+        if self.rounds < 2:
+            return 0.0
+        wins, blackjacks, _, losses = self.outcomes
+        mean = self.mean()
+        squares = wins + 2.25 * blackjacks + losses
+        return math.sqrt(max(0.0, squares / self.rounds - mean * mean))
+
+
+    def merge(self, other):
+        '''
+        Folds another Stats (for rounds played after this one's) into this one.
+        '''
+        self.low_bankroll = min(self.low_bankroll,
+                                self.bankroll + other.low_bankroll - other.start_bankroll)
+        self.high_bankroll = max(self.high_bankroll,
+                                 self.bankroll + other.high_bankroll - other.start_bankroll)
+        self.bankroll += other.bankroll - other.start_bankroll
+        self.rounds += other.rounds
+        self.outcomes = [a + b for a, b in zip(self.outcomes, other.outcomes)]
+        self.player_busts += other.player_busts
+        self.dealer_busts += other.dealer_busts
+        self.dealer_blackjacks += other.dealer_blackjacks
+
+
+    def as_dict(self):
+        '''
+        Everything as a plain dictionary.
+        '''
+        wins, blackjacks, pushes, losses = self.outcomes
+        return {'rounds': self.rounds, 'wins': wins, 'blackjacks': blackjacks,
+                'pushes': pushes, 'losses': losses, 'player_busts': self.player_busts,
+                'dealer_busts': self.dealer_busts, 'dealer_blackjacks': self.dealer_blackjacks,
+                'net': self.net(), 'mean': self.mean(), 'std_dev': self.std_dev(),
+                'bankroll': self.bankroll, 'low_bankroll': self.low_bankroll,
+                'high_bankroll': self.high_bankroll}
+
+
+##### SIMULATION #####
+def _policy_table(policy):
+    '''
+    The policy's answer for every (total, soft, upcard), at index
+    (total * 2 + soft) * 12 + upcard.
+    '''
+    return [bool(policy(total, bool(soft), up)) if up >= 2 else False \
+            for total in range(32) for soft in (0, 1) for up in range(12)]
+
+
+def simulate(rounds, policy = mimic_dealer, bet = 1, seed = None, bankroll = 100,
+             rng = None, decks = 1, penetration = 0):
+    '''
+    Plays rounds rounds, betting bet each time, and returns their Stats. Cards come from a
+    bj_classes.Shoe of decks decks, reshuffled whenever the cut card at penetration comes
+    out; the defaults reshuffle a single deck before every round, like blackjack.py. The
+    shuffle comes from rng (a random.Random) if given, or else a new one seeded with seed.
+
+    The bankroll is tracked but never runs out; the low-water mark in the Stats shows how
+    deep a real player would have needed pockets.
+    '''
+    rng = rng or random.Random(seed)
+    draw = rng.random
+    stats = Stats(bankroll)
+
+    hits = _policy_table(policy)
+
+    # Dealing is Shoe.deal_code, copied in below rather than called, since a method call per
+    # card would be most of the cost of a round. For the same reason the shoe's cards are
+    # worked on as a plain list (which Python indexes faster than an array), nothing here
+    # needs the rank counts kept up card by card, and the shoe is handed back (recounted)
+    # at the end.
+    shoe = bj_classes.Shoe(decks, penetration, rng = rng)
+    cards = shoe.cards.tolist()
+    size = len(cards)
+    values = bj_classes.CODE_VALUES
+    cut = shoe.cut
+    position = size # reshuffle before the first round
+
+    outcomes = stats.outcomes
+    player_busts = dealer_busts = dealer_blackjacks = 0
+    low = high = money = bankroll
+
+    for _ in range(rounds):
+        if position >= cut: # Shoe.shuffle
+            position = 0
+
+        # Deal: player, dealer, player, dealer, like starting_deal.
+        i = position + int(draw() * (size - position))
+        code = cards[i]
+        cards[i] = cards[position]
+        cards[position] = code
+        p1 = values[code]
+        i = position + 1 + int(draw() * (size - position - 1))
+        code = cards[i]
+        cards[i] = cards[position + 1]
+        cards[position + 1] = code
+        dealer_up = values[code]
+        i = position + 2 + int(draw() * (size - position - 2))
+        code = cards[i]
+        cards[i] = cards[position + 2]
+        cards[position + 2] = code
+        p2 = values[code]
+        i = position + 3 + int(draw() * (size - position - 3))
+        code = cards[i]
+        cards[i] = cards[position + 3]
+        cards[position + 3] = code
+        d2 = values[code]
+        position += 4
+
+        player = p1 + p2
+        player_aces = (p1 == 11) + (p2 == 11)
+        dealer = dealer_up + d2
+        dealer_aces = (dealer_up == 11) + (d2 == 11)
+        if player > 21: # two aces
+            player -= 10
+        if dealer > 21:
+            dealer -= 10
+
+        if player == 21 or dealer == 21:
+            if player == dealer:
+                outcome = PUSH
+            elif player == 21:
+                outcome = BLACKJACK
+            else:
+                outcome = LOSS
+                dealer_blackjacks += 1
+        else:
+            # Player's turn. raw is the total with every ace at 11; the hand's value knocks
+            # off one ace's 10 if that's over 21, just like get_hand_val.
+            raw = p1 + p2
+            while player < 21 and \
+                  hits[(player * 2 + (player_aces > 0 and raw <= 21)) * 12 + dealer_up]:
+                i = position + int(draw() * (size - position))
+                code = cards[i]
+                cards[i] = cards[position]
+                cards[position] = code
+                position += 1
+                card = values[code]
+                raw += card
+                player_aces += card == 11
+                player = raw - 10 if raw > 21 and player_aces else raw
+
+            if player > 21:
+                outcome = LOSS
+                player_busts += 1
+            else:
+                # Dealer's turn: hit on 17 or less.
+                raw = dealer_up + d2
+                while dealer <= 17:
+                    i = position + int(draw() * (size - position))
+                    code = cards[i]
+                    cards[i] = cards[position]
+                    cards[position] = code
+                    position += 1
+                    card = values[code]
+                    raw += card
+                    dealer_aces += card == 11
+                    dealer = raw - 10 if raw > 21 and dealer_aces else raw
+
+                if dealer > 21:
+                    outcome = WIN
+                    dealer_busts += 1
+                elif player > dealer:
+                    outcome = WIN
+                elif player == dealer:
+                    outcome = PUSH
+                else:
+                    outcome = LOSS
+
+        outcomes[outcome] += 1
+        money += PAYOFFS[outcome] * bet
+        if money < low:
+            low = money
+        elif money > high:
+            high = money
+
+    stats.rounds = rounds
+    stats.player_busts = player_busts
+    stats.dealer_busts = dealer_busts
+    stats.dealer_blackjacks = dealer_blackjacks
+    stats.bankroll = money
+    stats.low_bankroll = low
+    stats.high_bankroll = high
+    shoe.cards = bj_classes.array('B', cards)
+    shoe.position = position
+    shoe.rank_counts = [0] * 13
+    for code in cards[position:]:
+        shoe.rank_counts[code >> 2] += 1
+
+    return stats
+
+
+def _batch_tables(policy):
+    '''
+    Lookup tables for simulate_batch. A hand is tracked as a single state number,
+    raw * 2 + has_ace, where raw is its total with every ace at 11 (never more than 41:
+    a hand still hitting is worth at most 20, which is at most 30 raw, plus an ace). The
+    tables give, by state, its value, the state after another card, and whether the player
+    (by upcard) or the dealer would hit it; and, by (natural, player value, dealer value),
+    how the round came out.
+    '''
+    states = np.arange(84)
+    raw = states >> 1
+    has_ace = (states & 1) == 1
+    value = np.where(has_ace & (raw > 21), raw - 10, raw)
+    soft = has_ace & (raw <= 21)
+
+    after = np.zeros((84, 12), np.intp)
+    for card in range(2, 12):
+        after[:, card] = np.minimum(raw + card, 41) * 2 + (has_ace | (card == 11))
+
+    hits = _policy_table(policy)
+    player_hits = np.zeros((84, 12), bool)
+    for state in range(84):
+        if value[state] < 21:
+            player_hits[state] = hits[(value[state] * 2 + soft[state]) * 12:][:12]
+    dealer_hits = value <= 17
+
+    player = np.arange(32)[:, None]
+    dealer = np.arange(32)[None, :]
+    played = np.where(player > 21, LOSS,
+                      np.where(dealer > 21, WIN,
+                               np.where(player > dealer, WIN,
+                                        np.where(player == dealer, PUSH, LOSS))))
+    naturals = np.where(player == dealer, PUSH, np.where(player == 21, BLACKJACK, LOSS))
+    outcomes = np.stack([played, naturals]).ravel()
+
+    return value, after.ravel(), player_hits.ravel(), dealer_hits, outcomes
+
+
+def simulate_batch(rounds, policy = mimic_dealer, bet = 1, seed = None, bankroll = 100,
+                   chunk = BATCH_CHUNK):
+    '''
+    Same as simulate (with a fresh deck every round), but plays chunk rounds at a time as
+    NumPy arrays, which is around ten times faster. The shuffle comes from a NumPy
+    generator seeded with seed, so it deals different cards than simulate would for the
+    same seed, but the same ones every time. Without NumPy it just calls simulate.
+    '''
+    if np is None:
+        return simulate(rounds, policy, bet, seed, bankroll)
+
+    rng = np.random.default_rng(seed)
+    value, after, player_hits, dealer_hits, outcome_table = _batch_tables(policy)
+    payoffs = np.array(PAYOFFS) * bet
+    fresh_deck = np.array(bj_classes.CODE_VALUES, np.uint8)
+    stats = Stats(bankroll)
+    money = bankroll
+
+    done = 0
+    while done < rounds:
+        n = min(chunk, rounds - done)
+        done += n
+
+        # One fresh deck per round, all in one flat array: round r's cards are at
+        # r * 52 to r * 52 + 51, and position[r] is where its next card gets dealt from.
+        # Dealing is the same lazy shuffle as Shoe.deal_code: pick one of the cards left,
+        # hand it out, and move the card it was sitting on into the gap.
+        deck = np.tile(fresh_deck, n)
+        start = np.arange(0, 52 * n, 52)
+
+        # The first four cards go to everyone, so their picks are drawn up front.
+        picks = (rng.random((4, n)) * np.array([[52], [51], [50], [49]])).astype(np.intp)
+        first = list()
+        for j in range(4):
+            i = start + j + picks[j]
+            first.append(deck[i].astype(np.intp))
+            deck[i] = deck[start + j]
+        p1, dealer_up, p2, d2 = first
+        player = after[after[p1] * 12 + p2] # state 0, plus p1, plus p2
+        dealer = after[after[dealer_up] * 12 + d2]
+        position = start + 4
+
+        natural = (value[player] == 21) | (value[dealer] == 21)
+
+        # Player's turn, then dealer's. rows is the rounds that still want a card; each
+        # pass deals one card to each of them and drops the ones that are done.
+        rows = np.flatnonzero(player_hits[player * 12 + dealer_up] & ~natural)
+        while rows.size:
+            at = position[rows]
+            i = at + (rng.random(rows.size) * (rows * 52 + 52 - at)).astype(np.intp)
+            card = deck[i]
+            deck[i] = deck[at]
+            position[rows] = at + 1
+            state = after[player[rows] * 12 + card]
+            player[rows] = state
+            rows = rows[player_hits[state * 12 + dealer_up[rows]]]
+
+        player_value = value[player]
+        player_bust = player_value > 21
+        rows = np.flatnonzero(dealer_hits[dealer] & ~natural & ~player_bust)
+        while rows.size:
+            at = position[rows]
+            i = at + (rng.random(rows.size) * (rows * 52 + 52 - at)).astype(np.intp)
+            card = deck[i]
+            deck[i] = deck[at]
+            position[rows] = at + 1
+            state = after[dealer[rows] * 12 + card]
+            dealer[rows] = state
+            rows = rows[dealer_hits[state]]
+
+        dealer_value = value[dealer]
+        outcomes = outcome_table[(natural * 32 + player_value) * 32 + dealer_value]
+
+        counts = np.bincount(outcomes, minlength = 4)
+        for outcome in range(4):
+            stats.outcomes[outcome] += int(counts[outcome])
+        stats.player_busts += int(np.count_nonzero(player_bust & ~natural))
+        stats.dealer_busts += int(np.count_nonzero((dealer_value > 21) & ~natural))
+        stats.dealer_blackjacks += int(np.count_nonzero(natural & (dealer_value == 21) & \
+                                                        (player_value != 21)))
+
+        path = money + np.cumsum(payoffs[outcomes])
+        stats.low_bankroll = min(stats.low_bankroll, float(path.min()))
+        stats.high_bankroll = max(stats.high_bankroll, float(path.max()))
+        money = float(path[-1])
+
+    stats.rounds = rounds
+    stats.bankroll = money
+
+    return stats
+
+
+def _table_policy(table, total, soft, dealer_up):
+    '''
+    A policy that looks its answers up in a table made by _policy_table. Unlike the
+    closures hit_below makes, functools.partial(_table_policy, table) can be pickled, so
+    it's how simulate_parallel sends a policy to its workers.
+    '''
+    return table[(total * 2 + soft) * 12 + dealer_up]
+
+
+def _play_chunk(job):
+    '''
+    Plays one chunk of simulate_parallel's rounds, in a worker, and returns its Stats.
+    '''
+    rounds, table, bet, seed, batch, decks, penetration = job
+    policy = functools.partial(_table_policy, table)
+
+    if batch:
+        return simulate_batch(rounds, policy, bet, seed, bankroll = 0)
+    return simulate(rounds, policy, bet, seed, bankroll = 0, decks = decks,
+                    penetration = penetration)
+
+
+def simulate_parallel(rounds, policy = mimic_dealer, bet = 1, seed = None, bankroll = 100,
+                      workers = None, chunk = PARALLEL_CHUNK, batch = False, decks = 1,
+                      penetration = 0):
+    '''
+    Same as simulate (or simulate_batch, if batch is True), but split into chunks of chunk
+    rounds spread over workers processes (default: one per core).
+
+    Every chunk gets its own random stream, seeded from a random.Random(seed) in chunk
+    order, and the chunks' Stats are merged back in that same order, so the same seed gives
+    exactly the same results however many workers there are and whichever finishes first.
+    Only each chunk's Stats comes back from the workers, never the rounds themselves. Each
+    chunk starts its own shoe, so with penetration it reshuffles at every chunk boundary
+    too.
+    '''
+    seeds = random.Random(seed)
+    table = _policy_table(policy)
+    jobs = ((min(chunk, rounds - start), table, bet, seeds.getrandbits(64), batch, decks,
+             penetration) for start in range(0, rounds, chunk))
+
+    stats = Stats(bankroll)
+    with multiprocessing.Pool(workers) as pool:
+        for chunk_stats in pool.imap(_play_chunk, jobs):
+            stats.merge(chunk_stats)
+
+    return stats
+
+
+##### MAIN FUNCTION #####
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Simulate rounds of blackjack.')
+    parser.add_argument('-n', '--rounds', type = int, default = 1000000,
+                        help = 'rounds to play (default: 1,000,000)')
+    parser.add_argument('--stand', type = int, default = 18,
+                        help = 'stand on this total or more (default: 18, like the dealer)')
+    parser.add_argument('--decks', type = int, default = 1,
+                        help = 'decks in the shoe (default: 1)')
+    parser.add_argument('--penetration', type = float, default = 0,
+                        help = 'fraction of the shoe dealt before reshuffling (default: 0, '
+                               'i.e. every round)')
+    parser.add_argument('--seed', type = int, default = None)
+    parser.add_argument('-j', '--workers', type = int, default = 1,
+                        help = 'processes to spread the rounds over (default: 1; 0 for one '
+                               'per core)')
+    parser.add_argument('--batch', action = 'store_true',
+                        help = 'play a fresh deck per round with NumPy, many rounds at once')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.workers != 1:
+        stats = simulate_parallel(args.rounds, hit_below(args.stand), seed = args.seed,
+                                  workers = args.workers or None, batch = args.batch,
+                                  decks = args.decks, penetration = args.penetration)
+    elif args.batch:
+        stats = simulate_batch(args.rounds, hit_below(args.stand), seed = args.seed)
+    else:
+        stats = simulate(args.rounds, hit_below(args.stand), seed = args.seed,
+                         decks = args.decks, penetration = args.penetration)
+    elapsed = time.perf_counter() - start
+
+    print(stats)
+    print(f'{args.rounds / elapsed:,.0f} rounds per second')
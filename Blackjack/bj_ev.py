@@ -0,0 +1,445 @@
+'''
+Blackjack exact expected values and basic strategy.
+
+Where bj_engine plays millions of rounds and averages them, this works the answers out
+exactly, by going through every card that could come out next (and the chances of each,
+given the cards already gone) for every hand that could come up:
+
+    import bj_ev
+    analysis = bj_ev.analyze(decks = 1)
+    print(analysis.edge)                       # the house edge with basic strategy
+    print(analysis.strategy[(16, False, 10)])  # hit or stand on hard 16 against a 10?
+
+It plays by the rules in bj_engine's docstring, including the quirk that only ONE ace can
+drop to 1. The rules that might be worth changing are in a Rules tuple, and analyze keeps
+every analysis it's done, by rules and deck count, so asking again costs nothing.
+
+A few things worth knowing about how it's worked out:
+
+    - The player only gets to play if neither side has a blackjack, so the dealer's face-
+      down card is known NOT to make one. That makes the player's next card (very
+      slightly) more or less likely to be a ten or an ace, and it's taken into account.
+    - The expected values are per round, in bets, counting blackjacks at their payout.
+    - The strategy table is "total-dependent": one answer per (total, soft, upcard), which
+      is what a person could actually memorize. Each entry compares standing with hitting
+      (and then playing perfectly), averaged over every hand that comes to that total, each
+      weighted by how likely a player who keeps hitting is to end up holding it.
+'''
+
+import argparse
+import collections
+import functools
+import time
+
+# The rules analyze can vary. dealer_stands_on is the lowest total the dealer stands on
+# (dealer_turn hits 17 and stands on 18), blackjack_pays is what a player blackjack wins in
+# bets, and one_ace_only is get_hand_val's rule that at most one ace counts as 1 (set it to
+# False for the usual rule, where as many aces drop as it takes).
+Rules = collections.namedtuple('Rules', ['dealer_stands_on', 'blackjack_pays',
+                                         'one_ace_only'])
+
+GAME_RULES = Rules(dealer_stands_on = 18, blackjack_pays = 1.5, one_ace_only = True)
+
+# Card values, 2 to 11 (an ace). A shoe is a tuple of how many of each are left, with the
+# count for value v at index v - 2.
+VALUES = range(2, 12)
+
+
+def full_shoe(decks):
+    '''
+    The shoe before anything is dealt.
+    '''
+    return (4 * decks,) * 8 + (16 * decks, 4 * decks)
+
+
+def hand_value(raw, aces, rules = GAME_RULES):
+    '''
+    What a hand is worth, and whether it's soft (an ace still counting 11), as a tuple.
+    raw is its total with every ace at 11 and aces is how many aces are in it.
+    '''
+    if rules.one_ace_only:
+        if raw > 21 and aces:
+            return raw - 10, False
+        return raw, aces > 0
+
+    while raw > 21 and aces:
+        raw -= 10
+        aces -= 1
+    return raw, aces > 0
+
+
+def _take(shoe, value):
+    '''
+    The shoe with one card of value taken out.
+    '''
+    i = value - 2
+    return shoe[:i] + (shoe[i] - 1,) + shoe[i + 1:]
+
+
+def _natural_card(up):
+    '''
+    The hole card that would give the dealer a blackjack under up, or None.
+    '''
+    return {10: 11, 11: 10}.get(up)
+
+
+##### ANALYSIS #####
+class Analysis():
+    '''
+    Everything about one rule set and shoe size. Build them with analyze(), which remembers
+    them, rather than directly. The results are attributes:
+
+        dealer      dealer[up] is the chance of each way the dealer's hand can end, as a
+                    dictionary from final total (or 'bust') to probability, given they
+                    have no blackjack
+        table       table[(total, soft, up)] is (expected value of standing, of hitting)
+        strategy    strategy[(total, soft, up)] is True to hit
+        edge        expected value per round playing the strategy table (the house edge
+                    is minus this)
+        optimal     expected value per round playing every hand perfectly, knowing exactly
+                    which cards are in it; the best any hit/stand strategy can do
+
+    where total is the hand's value (4 to 20), soft is a bool, and up is the dealer's face-
+    up card (2 to 11).
+    '''
+    def __init__(self, decks = 1, rules = GAME_RULES):
+        '''
+        Constructor for Analysis. Does all the work, so it takes a little while (a few
+        seconds for one deck, more for bigger shoes).
+        '''
+        self.decks = decks
+        self.rules = rules
+        self.shoe = full_shoe(decks)
+
+        # The memos for the recursions below. They're per-analysis (rather than lru_caches
+        # on the functions) so they go away with it.
+        self._dealer_memo = dict()
+        self._finals_memo = dict()
+        self._best_memo = dict()
+
+        self.dealer = dict()
+        for up in VALUES:
+            finals = self._dealer_finals(_take(self.shoe, up), up)
+            labels = list(range(rules.dealer_stands_on, 22)) + ['bust']
+            self.dealer[up] = dict(zip(labels, finals))
+
+        self.optimal = self._round_ev(self._best)
+        self.table, self.strategy = self._build_table()
+
+        # By now every hand a policy could play has had its dealer totals worked out and
+        # kept in _finals_memo, so the (much bigger) memo of dealer draws that got there can
+        # go. If anything ever does need it again, it just gets worked out again.
+        self._dealer_memo.clear()
+
+        self.edge = self.round_ev(self.policy())
+
+
+    def __str__(self):
+        '''
+        Define text output for Analysis: the strategy table, a row per hand and a column per
+        upcard, H to hit and S to stand.
+        '''
+        ups = list(VALUES)
+        lines = [f'{self.decks} deck(s), {self.rules}',
+                 f'Expected return per unit bet: {self.edge:+.5f} with this table, '
+                 f'{self.optimal:+.5f} playing perfectly',
+                 '',
+                 '          ' + ' '.join(f'{"A" if up == 11 else up:>2}' for up in ups)]
+
+        for soft in (False, True):
+            for total in range(4 if not soft else 12, 21):
+                if (total, soft, 2) not in self.strategy:
+                    continue
+                moves = ' '.join(' H' if self.strategy[(total, soft, up)] else ' S' \
+                                 for up in ups)
+                lines.append(f'{"soft" if soft else "hard"} {total:>2}   {moves}')
+
+        return '\n'.join(lines)
+
+
+    # The dealer. _dealer_finals is the chance of each final total given the cards not yet
+    # seen (shoe, which includes the face-down card) and the upcard; _dealer_draws carries
+    # on from a hand once its face-down card is known. Both give a tuple of probabilities:
+    # one per total from dealer_stands_on to 21, then bust.
+
+    def _dealer_finals(self, shoe, up):
+        key = (shoe, up)
+        if key in self._finals_memo:
+            return self._finals_memo[key]
+
+        # The face-down card is any card but one making a blackjack, in proportion.
+        natural = _natural_card(up)
+        count = sum(shoe) - (shoe[natural - 2] if natural else 0)
+        finals = [0.0] * (23 - self.rules.dealer_stands_on)
+        for value in VALUES:
+            n = shoe[value - 2]
+            if n and value != natural:
+                after = self._dealer_draws(_take(shoe, value), up + value,
+                                           (up == 11) + (value == 11))
+                for i, p in enumerate(after):
+                    finals[i] += n * p
+
+        finals = tuple(f / count for f in finals)
+        self._finals_memo[key] = finals
+        return finals
+
+
+    def _dealer_draws(self, shoe, raw, aces):
+        key = (shoe, raw, aces)
+        if key in self._dealer_memo:
+            return self._dealer_memo[key]
+
+        stands_on = self.rules.dealer_stands_on
+        total, _ = hand_value(raw, aces, self.rules)
+        finals = [0.0] * (23 - stands_on)
+
+        if total > 21:
+            finals[-1] = 1.0
+        elif total >= stands_on:
+            finals[total - stands_on] = 1.0
+        else:
+            count = sum(shoe)
+            for value in VALUES:
+                n = shoe[value - 2]
+                if n:
+                    after = self._dealer_draws(_take(shoe, value), raw + value,
+                                               aces + (value == 11))
+                    for i, p in enumerate(after):
+                        finals[i] += n * p
+            finals = [f / count for f in finals]
+
+        finals = tuple(finals)
+        self._dealer_memo[key] = finals
+        return finals
+
+
+    # The player.
+
+    def _stand_ev(self, shoe, up, total):
+        '''
+        Expected value of standing on total, with shoe the cards not yet seen.
+        '''
+        finals = self._dealer_finals(shoe, up)
+        stands_on = self.rules.dealer_stands_on
+        ev = finals[-1] # dealer busts
+        for dealer, p in enumerate(finals[:-1], stands_on):
+            if total > dealer:
+                ev += p
+            elif total < dealer:
+                ev -= p
+        return ev
+
+
+    def _next_cards(self, shoe, up):
+        '''
+        The chance of each value being the player's next card, as (value, probability)
+        pairs. The face-down card is among the cards not yet seen, but it's known not to be
+        one that would have given the dealer a blackjack, which tilts the odds a little.
+        '''
+        natural = _natural_card(up)
+        count = sum(shoe)
+        if natural is None:
+            return [(value, shoe[value - 2] / count) for value in VALUES \
+                    if shoe[value - 2]]
+
+        # Any card c: the face-down card is one of the count - bad cards that aren't
+        # blackjack-makers, and c is then any of the remaining count - 1 cards.
+        bad = shoe[natural - 2]
+        return [(value, shoe[value - 2] * (count - bad - (value != natural)) \
+                        / ((count - bad) * (count - 1))) for value in VALUES \
+                if shoe[value - 2]]
+
+
+    def _best(self, shoe, up, raw, aces):
+        '''
+        (expected value playing perfectly, of standing, of hitting) for a hand, with shoe
+        the cards not yet seen. Hitting is None if the hand is 21 (which always stands) or
+        bust.
+        '''
+        key = (shoe, up, raw, aces)
+        if key in self._best_memo:
+            return self._best_memo[key]
+
+        total, _ = hand_value(raw, aces, self.rules)
+        if total > 21:
+            result = (-1.0, -1.0, None)
+        else:
+            stand = self._stand_ev(shoe, up, total)
+            if total == 21:
+                result = (stand, stand, None)
+            else:
+                hit = 0.0
+                for value, p in self._next_cards(shoe, up):
+                    hit += p * self._best(_take(shoe, value), up, raw + value,
+                                          aces + (value == 11))[0]
+                result = (max(stand, hit), stand, hit)
+
+        self._best_memo[key] = result
+        return result
+
+
+    def _follow(self, policy):
+        '''
+        A function giving a hand's expected value when played by policy (which takes
+        total, soft, and upcard, like bj_engine's).
+        '''
+        @functools.cache
+        def play(shoe, up, raw, aces):
+            total, soft = hand_value(raw, aces, self.rules)
+            if total > 21:
+                return -1.0
+            if total == 21 or not policy(total, soft, up):
+                return self._stand_ev(shoe, up, total)
+            return sum(p * play(_take(shoe, value), up, raw + value, aces + (value == 11)) \
+                       for value, p in self._next_cards(shoe, up))
+
+        return play
+
+
+    def _deals(self):
+        '''
+        Every starting deal, as (probability, cards not yet seen, upcard, player's first
+        card, player's second card). The order cards come out in doesn't change their
+        chances, so the upcard is taken first.
+        '''
+        count = sum(self.shoe)
+        for up in VALUES:
+            p_up = self.shoe[up - 2] / count
+            after_up = _take(self.shoe, up)
+            for first in VALUES:
+                p_first = after_up[first - 2] / (count - 1)
+                if not p_first:
+                    continue
+                after_first = _take(after_up, first)
+                for second in VALUES:
+                    p_second = after_first[second - 2] / (count - 2)
+                    if p_second:
+                        yield (p_up * p_first * p_second, _take(after_first, second),
+                               up, first, second)
+
+
+    def _round_ev(self, hand_ev):
+        '''
+        Expected value of a round, with hand_ev(shoe, up, raw, aces) giving the expected
+        value of playing a hand out (a number, or a tuple starting with one).
+        '''
+        ev = 0.0
+        for p, shoe, up, first, second in self._deals():
+            # The dealer's blackjack chance: the face-down card is any card still unseen.
+            natural = _natural_card(up)
+            dealer_blackjack = shoe[natural - 2] / sum(shoe) if natural else 0.0
+
+            raw = first + second
+            if raw == 21:
+                ev += p * (1 - dealer_blackjack) * self.rules.blackjack_pays
+            else:
+                played = hand_ev(shoe, up, raw, (first == 11) + (second == 11))
+                if isinstance(played, tuple):
+                    played = played[0]
+                ev += p * (dealer_blackjack * -1 + (1 - dealer_blackjack) * played)
+
+        return ev
+
+
+    def round_ev(self, policy):
+        '''
+        Expected value per round, in bets, of playing by policy (a function of total, soft,
+        and upcard that returns True to hit, like bj_engine's policies).
+        '''
+        return self._round_ev(self._follow(policy))
+
+
+    def _build_table(self):
+        '''
+        Works out the strategy table. See the notes at the top.
+        '''
+        # Every hand a player who keeps hitting could hold, with the chance of holding it,
+        # one card count at a time.
+        sums = collections.defaultdict(lambda: [0.0, 0.0, 0.0])
+        hands = collections.defaultdict(float)
+        for p, shoe, up, first, second in self._deals():
+            raw = first + second
+            if raw == 21:
+                continue
+            natural = _natural_card(up)
+            p *= 1 - (shoe[natural - 2] / sum(shoe) if natural else 0.0)
+            hands[(shoe, up, raw, (first == 11) + (second == 11))] += p
+
+        while hands:
+            more = collections.defaultdict(float)
+            for (shoe, up, raw, aces), p in hands.items():
+                total, soft = hand_value(raw, aces, self.rules)
+                if total >= 21:
+                    continue
+
+                _, stand, hit = self._best(shoe, up, raw, aces)
+                entry = sums[(total, soft, up)]
+                entry[0] += p
+                entry[1] += p * stand
+                entry[2] += p * hit
+
+                for value, q in self._next_cards(shoe, up):
+                    child = (_take(shoe, value), up, raw + value, aces + (value == 11))
+                    more[child] += p * q
+            hands = more
+
+        table = {key: (stand / p, hit / p) for key, (p, stand, hit) in sums.items()}
+        strategy = {key: hit > stand for key, (stand, hit) in table.items()}
+
+        return table, strategy
+
+
+    def policy(self):
+        '''
+        The strategy table as a policy function for bj_engine. Totals the table has no
+        entry for (like 21, or a hand that can't come up in a small shoe) stand.
+        '''
+        strategy = self.strategy
+
+        def policy(total, soft, dealer_up):
+            return strategy.get((total, soft, dealer_up), False)
+
+        return policy
+
+
+@functools.lru_cache(maxsize = None)
+def _analyze(decks, rules):
+    # The cache itself. lru_cache keys analyze(1) and analyze(decks = 1) differently, so
+    # everything comes through here positionally, in one form.
+    return Analysis(decks, rules)
+
+
+def analyze(decks = 1, rules = GAME_RULES):
+    '''
+    The Analysis for a shoe of decks decks and a set of Rules. Worked out the first time
+    it's asked for and remembered after that, however the arguments are passed.
+    '''
+    return _analyze(int(decks), Rules(*rules))
+
+
+##### MAIN FUNCTION #####
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Work out exact blackjack strategy.')
+    parser.add_argument('--decks', type = int, default = 1,
+                        help = 'decks in the shoe (default: 1, like blackjack.py)')
+    parser.add_argument('--dealer-stands-on', type = int,
+                        default = GAME_RULES.dealer_stands_on)
+    parser.add_argument('--blackjack-pays', type = float,
+                        default = GAME_RULES.blackjack_pays)
+    parser.add_argument('--all-aces-drop', action = 'store_true',
+                        help = 'let every ace count as 1, not just one')
+    args = parser.parse_args()
+
+    rules = Rules(args.dealer_stands_on, args.blackjack_pays, not args.all_aces_drop)
+
+    start = time.perf_counter()
+    analysis = analyze(args.decks, rules)
+    elapsed = time.perf_counter() - start
+
+    print(analysis)
+    print('')
+    print('Dealer final totals by upcard (given no dealer blackjack):')
+    for up, finals in analysis.dealer.items():
+        print(f'{"A" if up == 11 else up:>3}  ' + \
+              '  '.join(f'{label}: {p:.4f}' for label, p in finals.items()))
+    print(f'Worked out in {elapsed:.1f}s')
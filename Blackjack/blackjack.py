@@ -257,9 +257,14 @@ clear()
 pc = bj_classes.Player() # pc = player character
 dealer = bj_classes.Player()
 
+# One shoe for the whole game, dealt the same way bj_engine deals its simulated rounds.
+# With penetration 0 the cut card is right at the top, so it's a fresh deck every round.
+cards = bj_classes.Shoe(decks = 1, penetration = 0)
+
 while True:
-    # Fresh deck every round.
-    cards = bj_classes.Deck()
+    # Reshuffle once the cut card comes out.
+    if cards.needs_shuffle():
+        cards.shuffle()
 
     # Get the bet from the player.
     bet = get_bet(pc)
@@ -5,7 +5,24 @@
 
 # Imports
 from os import system, name
+from array import array
+import argparse
+import functools
+import itertools
+import json
 import math
+import sys
+
+# NumPy is only used to speed up pruning very large solution sets and evaluating many boxes
+# at once (evaluateCages); everything works without it.
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# How many sub-problems (and whole results) the memoized functions below remember before the
+# least recently used ones get thrown out.
+ENUM_CACHE_SIZE = 1 << 16
 
 # These first two functions are copied from other projects; I may want to make this a tiny
 # module eventually.
@@ -33,7 +50,7 @@ def get_any_key():
 
 
 ##### ADDITION ALGORITHM #####
-def addSet(outputVal, maxVal, boxSize):
+def addSet(outputVal, maxVal, boxSize, numRepeats = None, maxRepeats = 2):
     '''
     Determines which combinations will produce a sum of outputVal given a maximum possible
     addend of maxVal and boxSize total addends.
@@ -47,38 +64,156 @@ def addSet(outputVal, maxVal, boxSize):
     In our example above, there are several possible solutions (5 + 2 + 1, 4 + 3 + 1, etc.)
     which will then be represented as [[5, 2, 1],
                                        [4, 3, 1], ...]
+
+    Passing numRepeats (and optionally maxRepeats) applies the pruneRepeats rule as it goes
+    instead, giving the same result as addSet followed by pruneRepeats.
     '''
 
     # Create an empty list.
     solutionSet = list()
-    
-    # Determine the smallest number we need to search toward; this is where we stop in order
-    # to avoid repeating sequences in different orders (e.g., [5, 2, 1] and [2, 5, 1]). In
-    # this case, it's the output divided by the size of the box. (Consider that the closest
-    # set of three addends for our example above is [3, 3, 2], and that 8 / 3 = 2.67)
-    lastVal = math.ceil(outputVal / boxSize)
-    
-    # Start from the largest number possible (i.e., the size of the grid). We are going to
-    # be subtracting this from our target value to determine what's leftover.
-    for i in range(maxVal, lastVal - 1, -1):
-        # Ignore any subtractions that would produce a negative number.
-        if outputVal > i:
-            # If we have only two numbers, then perform the subtraction. Otherwise, we need
-            # to use recursion.
+
+    # One cell is just the number itself, if it fits.
+    if boxSize < 2:
+        return [[outputVal]] if boxSize == 1 and 1 <= outputVal <= maxVal else solutionSet
+
+    if numRepeats is not None:
+        return _addSetRepeats(outputVal, maxVal, boxSize, numRepeats, maxRepeats)
+
+    # The numbers chosen so far, shared by every level of the recursion. Each solution gets
+    # copied out of here exactly once, when it's complete, instead of being rebuilt with
+    # [i] + a at every level on the way back up.
+    prefix = list()
+
+    def extend(outputVal, maxVal, boxSize):
+        # Determine the smallest number we need to search toward; this is where we stop in
+        # order to avoid repeating sequences in different orders (e.g., [5, 2, 1] and
+        # [2, 5, 1]). In this case, it's the output divided by the size of the box. (Consider
+        # that the closest set of three addends for our example above is [3, 3, 2], and that
+        # 8 / 3 = 2.67) Below this, the other cells would each need more than i.
+        lastVal = -(-outputVal // boxSize) # integer ceiling
+
+        # Start from the largest number possible (i.e., the size of the grid), unless that
+        # would leave too little for the other cells: each of the remaining boxSize - 1 cells
+        # needs at least a 1, so nothing bigger than outputVal - (boxSize - 1) can work.
+        # Between the two bounds, every number we try leads to at least one solution, so the
+        # time spent tracks the number of answers rather than the number of dead ends.
+        firstVal = min(maxVal, outputVal - (boxSize - 1))
+
+        # If we have only two numbers, then perform the subtraction. Otherwise, we need to use
+        # recursion.
+        if boxSize == 2:
+            for i in range(firstVal, lastVal - 1, -1):
+                solutionSet.append(prefix + [i, outputVal - i])
+        else:
+            for i in range(firstVal, lastVal - 1, -1):
+                # Recursion rules: we are now adding to outputVal - i, our max value is now i
+                # (to prevent duplication), and our box size is reduced by one.
+                prefix.append(i)
+                extend(outputVal - i, i, boxSize - 1)
+                prefix.pop()
+
+    extend(outputVal, maxVal, boxSize)
+
+    return solutionSet
+
+
+def _addSetRepeats(outputVal, maxVal, boxSize, numRepeats, maxRepeats):
+    # addSet under a repeat rule. Each level also knows how many times its largest allowed
+    # number (the one chosen just above it) has already been used, and how many repeated
+    # sets are still allowed, so a number is only tried if the cells after it can still
+    # make up the rest under the rule. That keeps the search on branches that lead
+    # somewhere, the same as the unruled addSet.
+    solutionSet = list()
+    prefix = list()
+
+    def extend(outputVal, maxVal, boxSize, run, repeatsLeft):
+        lastVal = -(-outputVal // boxSize)
+        firstVal = min(maxVal, outputVal - (boxSize - 1))
+
+        for i in range(firstVal, lastVal - 1, -1):
+            state = _repeatStep(i, maxVal, run, repeatsLeft, maxRepeats)
+            if state is None:
+                continue
+            rest = outputVal - i
+
             if boxSize == 2:
-                solutionSet.append([i, outputVal - i])
+                if rest <= i and _repeatStep(rest, i, *state, maxRepeats) is not None:
+                    solutionSet.append(prefix + [i, rest])
             else:
-                # Recursion rules: we are now adding to outputVal - i, our max value is now
-                # i (to prevent duplication), and our box size is reduced by one.
-                solutionSubSet = addSet(outputVal - i, i, boxSize - 1)
+                bounds = _repeatBounds(boxSize - 1, i, *state, maxRepeats)
+                if bounds is not None and bounds[0] <= rest <= bounds[1]:
+                    prefix.append(i)
+                    extend(rest, i, boxSize - 1, *state)
+                    prefix.pop()
+
+    bounds = _repeatBounds(boxSize, maxVal, 0, numRepeats, maxRepeats)
+    if bounds is not None and bounds[0] <= outputVal <= bounds[1]:
+        extend(outputVal, maxVal, boxSize, 0, numRepeats)
 
-                # If anything was returned, stick it on to the solution set.
-                for a in solutionSubSet:
-                    solutionSet.append([i] + a)
-    
     return solutionSet
 
 
+def _repeatStep(i, maxVal, run, repeatsLeft, maxRepeats):
+    # The (run, repeatsLeft) after choosing i where maxVal was the last number chosen and
+    # has been used run times in a row, or None if i breaks the repeat rule. Combinations
+    # come out largest first, so equal numbers always sit together.
+    run = run + 1 if i == maxVal else 1
+    if run > maxRepeats:
+        return None
+    if run == maxRepeats:
+        if not repeatsLeft:
+            return None
+        repeatsLeft -= 1
+    return run, repeatsLeft
+
+
+def _repeatBounds(boxSize, maxVal, run, repeatsLeft, maxRepeats):
+    # addBounds for the cells still to fill partway through a combination: numbers up to
+    # maxVal, of which maxVal itself has already been used run times, with repeatsLeft
+    # repeated sets still allowed.
+    def extreme(values):
+        # Greedily give the most copies to the numbers we want most of. Each repeated set
+        # buys exactly one more copy of some number, so spending it on the most extreme
+        # one is always best.
+        total = 0
+        cellsLeft = boxSize
+        left = repeatsLeft
+
+        for v in values:
+            if cellsLeft == 0:
+                break
+            used = run if v == maxVal else 0
+            uses = min(cellsLeft, max(0, maxRepeats - 1 - used) + \
+                       (1 if left and used < maxRepeats else 0))
+            if uses and used + uses == maxRepeats:
+                left -= 1
+            total += uses * v
+            cellsLeft -= uses
+
+        return None if cellsLeft else total
+
+    low = extreme(range(1, maxVal + 1))
+    high = extreme(range(maxVal, 0, -1))
+
+    return None if low is None else (low, high)
+
+
+def addBounds(boxSize, maxVal, numRepeats = None, maxRepeats = 2):
+    '''
+    The smallest and largest sums boxSize numbers from 1 to maxVal can make, as a tuple, or
+    None if they can't fill the box at all. With no repeat rule that's just (boxSize,
+    boxSize * maxVal); with one (the same numRepeats/maxRepeats as pruneRepeats), each
+    number can only be used so many times, which pushes both ends inward.
+
+    Example: three cells on a 5x5 board with no repeats can make anything from 1 + 2 + 3 = 6
+    to 5 + 4 + 3 = 12, rather than 3 to 15.
+    '''
+    if numRepeats is None:
+        return (boxSize, boxSize * maxVal) if boxSize >= 1 and maxVal >= 1 else None
+
+    return _repeatBounds(boxSize, maxVal, 0, numRepeats, maxRepeats)
+
+
 ##### SUBTRACTION ALGORITHM #####
 def subtractSet(outputVal, maxVal):
     '''
@@ -125,34 +260,81 @@ def multiplySet(outputVal, maxVal, boxSize):
     # Create an empty list.
     solutionSet = list()
     
-    # Determine the smallest number we need to search toward; this is where we stop in order
-    # to avoid repeating sequences in different orders (e.g., [6, 2, 2] and [2, 2, 6]). In
-    # this case, it's the Nth root of the output value, where N is the size of the box.
-    # (Consider that the closest set of three factors for our example above is [4, 3, 2],
-    # and that 24 ^ (1/3) = 2.88)
-    lastVal = math.ceil(outputVal ** (1 / boxSize))
-    
-    # Start from the largest number possible (i.e., the size of the grid). We are going to
-    # be dividing this from our target value to determine what's leftover.
-    for i in range(maxVal, lastVal - 1, -1):
-        # Ignore any divisions that would produce a fractional number.
-        if outputVal % i == 0:
-            # If we have only two numbers, then perform the division. Otherwise, we need to
-            # use recursion.
-            if boxSize == 2:
-                solutionSet.append([i, int(outputVal / i)]) # cast to int
-            else:
-                # Recursion rules: we are now multiplying to outputVal / i, our max value
-                # is now i (to prevent duplication), and our box size is reduced by one.
-                solutionSubSet = multiplySet(int(outputVal / i), i, boxSize - 1)
-                
-                # If anything was returned, stick it on to the solution set.
-                for a in solutionSubSet:
-                    solutionSet.append([i] + a)
-    
+    # Nothing multiplies to zero or less without a zero, and we don't have those.
+    if outputVal < 1:
+        return solutionSet
+
+    # Only divisors of outputVal can possibly be factors, so that's all we look at, largest
+    # first (see _divisors). We stop once we get below the Nth root of the output value, where
+    # N is the size of the box, in order to avoid repeating sequences in different orders
+    # (e.g., [6, 2, 2] and [2, 2, 6]). (Consider that the closest set of three factors for
+    # our example above is [4, 3, 2], and that 24 ^ (1/3) = 2.88) This is all done in
+    # integers, since with big boards the products get large enough for floating-point
+    # roots to round the wrong way.
+    for i in _divisors(outputVal, maxVal):
+        if i ** boxSize < outputVal:
+            break
+
+        # If we have only two numbers, then perform the division. Otherwise, we need to use
+        # recursion.
+        if boxSize == 2:
+            solutionSet.append([i, outputVal // i])
+        else:
+            # Recursion rules: we are now multiplying to outputVal / i, our max value is now
+            # i (to prevent duplication), and our box size is reduced by one.
+            solutionSubSet = multiplySet(outputVal // i, i, boxSize - 1)
+
+            # If anything was returned, stick it on to the solution set.
+            for a in solutionSubSet:
+                solutionSet.append([i] + a)
+
     return solutionSet
 
 
+@functools.lru_cache(maxsize = ENUM_CACHE_SIZE)
+def _factorize(outputVal, maxVal):
+    '''
+    Prime factorization of outputVal as a tuple of (prime, power) pairs, or None if it has a
+    prime factor bigger than maxVal (in which case no set of numbers up to maxVal can
+    multiply to it). Trial division only has to go up to maxVal for that reason.
+    '''
+    if outputVal < 1:
+        return None
+
+    factors = list()
+    remaining = outputVal
+
+    for p in range(2, maxVal + 1):
+        if remaining == 1:
+            break
+        power = 0
+        while remaining % p == 0:
+            remaining //= p
+            power += 1
+        if power:
+            factors.append((p, power))
+
+    return tuple(factors) if remaining == 1 else None
+
+
+@functools.lru_cache(maxsize = ENUM_CACHE_SIZE)
+def _divisors(outputVal, maxVal):
+    '''
+    The divisors of outputVal that are no bigger than maxVal, largest first, built from its
+    cached factorization.
+    '''
+    factors = _factorize(outputVal, maxVal)
+    if factors is None:
+        return ()
+
+    divisors = [1]
+    for p, power in factors:
+        divisors = [d * p ** e for d in divisors for e in range(power + 1) \
+                    if d * p ** e <= maxVal]
+
+    return tuple(sorted(divisors, reverse = True))
+
+
 ##### DIVISION ALGORITHM #####
 def divideSet(outputVal, maxVal):
     '''
@@ -208,41 +390,906 @@ def pruneRepeats(solutionSet, maxVal, numRepeats = 0, maxRepeats = 2):
     scenarios one is likely to encounter with a normal kenken puzzle.
     '''
 
-    # Sentinel value that is reset every time a solution is removed.
-    remove = False
+    # Big sets go through NumPy, as long as every solution is the same length (they always
+    # are when they come from a single enumerator call).
+    if np is not None and len(solutionSet) >= NUMPY_PRUNE_THRESHOLD and \
+       len(set(map(len, solutionSet))) == 1:
+        return _pruneRepeatsBatch(solutionSet, maxVal, numRepeats, maxRepeats)
+
+    # Otherwise, each solution gets counted exactly once, and what decides its fate is just
+    # the shape of those counts (e.g., [6, 2, 2] and [4, 4, 1] are both "one pair"), so the
+    # verdict for each shape is worked out once and remembered. Building a new list of the
+    # keepers, rather than copying the whole thing and calling .remove() on the losers, keeps
+    # this to a single pass instead of one pass per removal.
+    numbers = set(range(1, maxVal + 1))
+    verdicts = dict()
+    newSolutionSet = list()
 
-    # New copy of solutionSet to be pruned and returned.
-    newSolutionSet = solutionSet.copy() # the .copy() is vital, turns out!
-    
     for sol in solutionSet:
-        # Count each number in the solution.
-        counts = list()
-        for i in range(maxVal, 0, -1):
-            counts.append(sol.count(i))
-        
-        # If there are more than the permitted count of any given number (i.e., maxRepeats),
-        # remove.
-        if [i for i in counts if i > maxRepeats]:
-            remove = True
-        
-        # If there are more than the permitted number of repeats (i.e., numRepeats), remove.
-        # Note that we are looking for i >= maxRepeats here because here we're counting
-        # legal repetitions.
-        if len([i for i in counts if i >= maxRepeats]) > numRepeats:
-            remove = True
-        
-        # Prune and reset.
-        if remove:
-            newSolutionSet.remove(sol)
-            remove = False
-    
+        signature = tuple(sorted(map(sol.count, numbers.intersection(sol))))
+
+        keep = verdicts.get(signature)
+        if keep is None:
+            keep = repeatsAllowed(signature, numRepeats, maxRepeats)
+            verdicts[signature] = keep
+
+        if keep:
+            newSolutionSet.append(sol)
+
     return newSolutionSet
 
 
+def repeatsAllowed(counts, numRepeats = 0, maxRepeats = 2):
+    '''
+    The rule pruneRepeats applies, given how many times each number appears in a solution.
+    '''
+    # If there are more than the permitted count of any given number (i.e., maxRepeats), it's
+    # out. If there are more than the permitted number of repeats (i.e., numRepeats), it's
+    # also out. Note that we are looking for >= maxRepeats for the latter because there we're
+    # counting legal repetitions.
+    if any(c > maxRepeats for c in counts):
+        return False
+
+    return sum(1 for c in counts if c >= maxRepeats) <= numRepeats
+
+
+# Below this many solutions, building NumPy arrays costs more than it saves.
+NUMPY_PRUNE_THRESHOLD = 2048
+
+
+def _pruneRepeatsBatch(solutionSet, maxVal, numRepeats, maxRepeats):
+    '''
+    NumPy version of pruneRepeats for big solution sets: every solution's counts come out of
+    a single vectorized comparison, and the rule is applied to all of them at once.
+    '''
+    values = np.asarray(solutionSet, dtype = np.int16)                  # (solutions, cells)
+    numbers = np.arange(1, maxVal + 1, dtype = np.int16)
+    counts = (values[:, :, None] == numbers).sum(axis = 1)             # (solutions, maxVal)
+
+    keep = ~(counts > maxRepeats).any(axis = 1) & \
+           ((counts >= maxRepeats).sum(axis = 1) <= numRepeats)
+
+    return [sol for sol, k in zip(solutionSet, keep.tolist()) if k]
+
+
+##### MEMOIZED ENUMERATION #####
+# addSet and multiplySet above build every answer by gluing [i] onto each answer from the
+# level below, so a long combination gets copied once per level, and the same sub-problems
+# (say, "three numbers up to 6 that add to 11") get solved over and over. The versions below
+# split the work in two instead:
+#
+#   1. For each sub-problem, remember only which first numbers lead anywhere. That's a small
+#      tuple of ints, it's shared between every call that runs into the same sub-problem, and
+#      it lives in a bounded LRU cache so a long session can't grow it forever.
+#   2. Walk those choices to produce the actual combinations, building each tuple exactly
+#      once, at the end. This can be done lazily (iterAddSet/iterMultiplySet) or all at once
+#      with the result cached too (memoAddSet/memoMultiplySet).
+#
+# Results come out in the same order as addSet/multiplySet, just as tuples.
+
+@functools.lru_cache(maxsize = ENUM_CACHE_SIZE)
+def _addBranches(outputVal, maxVal, boxSize, run = 0, repeatsLeft = None, maxRepeats = 2):
+    '''
+    The first numbers (largest first) that can start a boxSize-number sum to outputVal with
+    nothing bigger than maxVal. Each choice i leaves the sub-problem (outputVal - i, i,
+    boxSize - 1).
+
+    With a repeat rule (repeatsLeft not None), maxVal has already been used run times just
+    above, and only numbers that leave a sub-problem still solvable under the rule count;
+    each choice i then leaves (outputVal - i, i, boxSize - 1, *_repeatStep(i, ...)).
+    '''
+    if boxSize == 1:
+        if not 1 <= outputVal <= maxVal:
+            return ()
+        if repeatsLeft is not None and \
+           _repeatStep(outputVal, maxVal, run, repeatsLeft, maxRepeats) is None:
+            return ()
+        return (outputVal,)
+
+    # Same floor as addSet, and leave at least 1 for each of the remaining cells.
+    lastVal = -(-outputVal // boxSize) # integer ceiling
+    choices = range(min(maxVal, outputVal - boxSize + 1), lastVal - 1, -1)
+
+    if repeatsLeft is None:
+        return tuple(i for i in choices if _addBranches(outputVal - i, i, boxSize - 1))
+
+    # Under the rule, turn the whole sub-problem away at once if the target is out of
+    # reach, before trying any numbers.
+    bounds = _repeatBounds(boxSize, maxVal, run, repeatsLeft, maxRepeats)
+    if bounds is None or not bounds[0] <= outputVal <= bounds[1]:
+        return ()
+
+    branches = list()
+    for i in choices:
+        state = _repeatStep(i, maxVal, run, repeatsLeft, maxRepeats)
+        if state is not None and _addBranches(outputVal - i, i, boxSize - 1, *state,
+                                              maxRepeats):
+            branches.append(i)
+
+    return tuple(branches)
+
+
+@functools.lru_cache(maxsize = ENUM_CACHE_SIZE)
+def _multiplyBranches(outputVal, maxVal, boxSize, run = 0, repeatsLeft = None,
+                      maxRepeats = 2):
+    '''
+    The first numbers (largest first) that can start a boxSize-number product of outputVal
+    with nothing bigger than maxVal. Each choice i leaves the sub-problem (outputVal // i,
+    i, boxSize - 1). Takes a repeat rule the same way _addBranches does.
+    '''
+    if boxSize == 1:
+        if not 1 <= outputVal <= maxVal:
+            return ()
+        if repeatsLeft is not None and \
+           _repeatStep(outputVal, maxVal, run, repeatsLeft, maxRepeats) is None:
+            return ()
+        return (outputVal,)
+
+    # Same divisors and floor (the boxSize-th root) as multiplySet.
+    branches = list()
+    for i in _divisors(outputVal, maxVal):
+        if i ** boxSize < outputVal:
+            break
+        if repeatsLeft is None:
+            if _multiplyBranches(outputVal // i, i, boxSize - 1):
+                branches.append(i)
+            continue
+
+        state = _repeatStep(i, maxVal, run, repeatsLeft, maxRepeats)
+        if state is not None and _multiplyBranches(outputVal // i, i, boxSize - 1, *state,
+                                                   maxRepeats):
+            branches.append(i)
+
+    return tuple(branches)
+
+
+def _walkBranches(branches, remainder, outputVal, maxVal, boxSize, numRepeats = None,
+                  maxRepeats = 2):
+    '''
+    Generator that turns a branches function into combinations. remainder(outputVal, i)
+    gives what's left for the other cells once i has been chosen.
+
+    If numRepeats is given, the same repeat rule as pruneRepeats is applied by the branches
+    themselves, which only offer numbers that still lead to a combination obeying it. The
+    walk just carries each level's repeat state down (see _repeatStep), so it never steps
+    into a dead end either way.
+    '''
+    if boxSize < 1:
+        return
+
+    pruning = numRepeats is not None
+    rule = (0, numRepeats, maxRepeats) if pruning else ()
+
+    if boxSize == 1:
+        for i in branches(outputVal, maxVal, 1, *rule):
+            yield (i,)
+        return
+
+    # Walk with an explicit stack and a single scratch list; the tuple is only built once a
+    # combination is complete. Each entry also carries the largest number allowed at that
+    # level and, under a repeat rule, how many times it's been used already and how many
+    # repeated sets are left.
+    combo = [0] * boxSize
+    stack = [(outputVal, maxVal, boxSize, iter(branches(outputVal, maxVal, boxSize, *rule)),
+              0, numRepeats)]
+
+    while stack:
+        remaining, top, cells, choices, run, repeatsLeft = stack[-1]
+        i = next(choices, None)
+
+        if i is None:
+            stack.pop()
+            continue
+
+        combo[boxSize - cells] = i
+        rest = remainder(remaining, i)
+        if cells == 2:
+            combo[-1] = rest
+            yield tuple(combo)
+        elif pruning:
+            iRun, iLeft = _repeatStep(i, top, run, repeatsLeft, maxRepeats)
+            stack.append((rest, i, cells - 1,
+                          iter(branches(rest, i, cells - 1, iRun, iLeft, maxRepeats)), iRun,
+                          iLeft))
+        else:
+            stack.append((rest, i, cells - 1, iter(branches(rest, i, cells - 1)), 0, None))
+
+
+def _subtract(outputVal, i):
+    return outputVal - i
+
+
+def _divide(outputVal, i):
+    return outputVal // i
+
+
+def iterAddSet(outputVal, maxVal, boxSize, numRepeats = None, maxRepeats = 2):
+    '''
+    Lazy version of addSet: yields the same combinations, in the same order, as tuples.
+
+    Passing numRepeats (and optionally maxRepeats) gives the same result as running the
+    output through pruneRepeats, except that the walk never even starts down a branch that
+    can't finish under the rule: every level checks the repeat-aware bounds for the cells
+    still to fill (see addBounds) before trying any numbers.
+    '''
+    return _walkBranches(_addBranches, _subtract, outputVal, maxVal, boxSize, numRepeats,
+                         maxRepeats)
+
+
+def iterMultiplySet(outputVal, maxVal, boxSize, numRepeats = None, maxRepeats = 2):
+    '''
+    Lazy version of multiplySet: yields the same combinations, in the same order, as tuples.
+    Takes numRepeats and maxRepeats the same way iterAddSet does.
+    '''
+    return _walkBranches(_multiplyBranches, _divide, outputVal, maxVal, boxSize, numRepeats,
+                         maxRepeats)
+
+
+@functools.lru_cache(maxsize = ENUM_CACHE_SIZE)
+def memoAddSet(outputVal, maxVal, boxSize, numRepeats = None, maxRepeats = 2):
+    '''
+    Memoized version of addSet (or of addSet plus pruneRepeats, if numRepeats is given).
+    Returns a tuple of tuples, so the cached result can be shared safely between callers.
+    '''
+    return tuple(iterAddSet(outputVal, maxVal, boxSize, numRepeats, maxRepeats))
+
+
+@functools.lru_cache(maxsize = ENUM_CACHE_SIZE)
+def memoMultiplySet(outputVal, maxVal, boxSize, numRepeats = None, maxRepeats = 2):
+    '''
+    Memoized version of multiplySet (or of multiplySet plus pruneRepeats, if numRepeats is
+    given). Returns a tuple of tuples, so the cached result can be shared safely between
+    callers.
+    '''
+    return tuple(iterMultiplySet(outputVal, maxVal, boxSize, numRepeats, maxRepeats))
+
+
+def _enumCaches():
+    # Every memoized function in this file (some are defined further down).
+    return (_factorize, _divisors, _addBranches, _multiplyBranches, memoAddSet,
+            memoMultiplySet, _countSum, _countProduct, _memoPlacements, _memoPlacementBits,
+            _comboTable, _repeatMask)
+
+
+def clearEnumCache():
+    '''
+    Empties all of the memoized enumeration caches.
+    '''
+    for cached in _enumCaches():
+        cached.cache_clear()
+
+
+def enumCacheInfo():
+    '''
+    How often each memoized function has been called and how often that was answered from
+    its cache, as {name: (hits, misses)}. Every miss is a real enumeration. lru_cache keeps
+    these counts anyway, so looking at them before and after something costs nothing extra.
+    '''
+    return {cached.__name__: (cached.cache_info().hits, cached.cache_info().misses) \
+            for cached in _enumCaches()}
+
+
+##### COUNTING #####
+# Sometimes all we want to know is how many ways a box can be filled (to rank boxes by how
+# much they narrow things down, say), and building every combination just to call len() on
+# it is a waste. These count them instead, without building anything.
+#
+# The trick is to think of a combination (largest first) as a run of decisions from the
+# biggest number down: for each number i, use it 0, 1, 2, ... times, then move on to i - 1.
+# That gives a recurrence over (what's left of the target, the biggest number still
+# allowed, cells left, repeated sets still allowed), and since there are only so many of
+# those, memoizing it makes big boxes and big boards cheap.
+
+@functools.lru_cache(maxsize = ENUM_CACHE_SIZE)
+def _countSum(outputVal, maxVal, boxSize, repeatsLeft, maxRepeats):
+    '''
+    Number of ways to write outputVal as boxSize numbers from 1 to maxVal, where each number
+    is used at most maxRepeats times and only repeatsLeft of them may reach maxRepeats.
+    '''
+    if boxSize == 0:
+        return 1 if outputVal == 0 else 0
+
+    # Too little or too much left over for the cells remaining.
+    if maxVal == 0 or outputVal < boxSize or outputVal > boxSize * maxVal:
+        return 0
+
+    # Skip maxVal entirely...
+    total = _countSum(outputVal, maxVal - 1, boxSize, repeatsLeft, maxRepeats)
+
+    # ...or use it once, twice, and so on.
+    for uses in range(1, min(boxSize, maxRepeats) + 1):
+        remaining = outputVal - uses * maxVal
+        if remaining < 0:
+            break
+
+        left = repeatsLeft
+        if uses == maxRepeats:
+            if not repeatsLeft:
+                break
+            left -= 1
+
+        total += _countSum(remaining, maxVal - 1, boxSize - uses, left, maxRepeats)
+
+    return total
+
+
+@functools.lru_cache(maxsize = ENUM_CACHE_SIZE)
+def _countProduct(outputVal, maxVal, boxSize, repeatsLeft, maxRepeats):
+    '''
+    Number of ways to write outputVal as a product of boxSize numbers from 1 to maxVal,
+    under the same repeat rules as _countSum.
+    '''
+    if boxSize == 0:
+        return 1 if outputVal == 1 else 0
+
+    if maxVal == 0 or outputVal > maxVal ** boxSize:
+        return 0
+
+    total = _countProduct(outputVal, maxVal - 1, boxSize, repeatsLeft, maxRepeats)
+
+    remaining = outputVal
+    for uses in range(1, min(boxSize, maxRepeats) + 1):
+        if remaining % maxVal:
+            break
+        remaining //= maxVal
+
+        left = repeatsLeft
+        if uses == maxRepeats:
+            if not repeatsLeft:
+                break
+            left -= 1
+
+        total += _countProduct(remaining, maxVal - 1, boxSize - uses, left, maxRepeats)
+
+    return total
+
+
+def _repeatArgs(boxSize, numRepeats, maxRepeats):
+    # With no repeat rule, no number can be used more than boxSize times anyway.
+    if numRepeats is None:
+        return 0, boxSize + 1
+    return numRepeats, maxRepeats
+
+
+def countAddSet(outputVal, maxVal, boxSize, numRepeats = None, maxRepeats = 2):
+    '''
+    How many combinations addSet would return (or addSet plus pruneRepeats, if numRepeats
+    is given), without building any of them.
+    '''
+    if boxSize < 1:
+        return 0
+    return _countSum(outputVal, maxVal, boxSize, *_repeatArgs(boxSize, numRepeats,
+                                                               maxRepeats))
+
+
+def countMultiplySet(outputVal, maxVal, boxSize, numRepeats = None, maxRepeats = 2):
+    '''
+    How many combinations multiplySet would return (or multiplySet plus pruneRepeats, if
+    numRepeats is given), without building any of them.
+    '''
+    if boxSize < 1 or outputVal < 1:
+        return 0
+    return _countProduct(outputVal, maxVal, boxSize, *_repeatArgs(boxSize, numRepeats,
+                                                                   maxRepeats))
+
+
+##### CELL PLACEMENT ALGORITHM #####
+def iterPlacements(operator, outputVal, maxVal, cells):
+    '''
+    Works out the ways to fill a box given where its cells actually are, rather than asking
+    for numRepeats/maxRepeats. cells is a list of (row, col) pairs, counted from zero, and
+    each fill comes out as a tuple whose nth entry goes in the nth cell.
+
+    Example:  __ __   With cells [(0, 0), (0, 1), (1, 1)] and "7+" on a 4x4 board, the
+             |__|__|  left and bottom cells can share a number, so (3, 1, 3) is fine, but
+                |__|  (1, 3, 3) isn't, since the two 3s would be in the same column.
+
+    Fills are built one cell at a time, and a partial fill is dropped as soon as it repeats
+    a number in a row or column, or leaves a remainder the other cells can't make up (a sum
+    too big or too small, or a product that doesn't divide evenly). So nothing is generated
+    just to be thrown away later.
+
+    Single-cell boxes are just given values, and are accepted with any operator (or '=').
+    Every target is at least 1, so anything less has no fills at all.
+    '''
+    boxSize = len(cells)
+    if outputVal < 1:
+        return
+
+    # Which earlier cells share a row or column with each cell, and so can't match it.
+    conflicts = [[j for j in range(p) if cells[j][0] == cells[p][0] or \
+                                         cells[j][1] == cells[p][1]] for p in range(boxSize)]
+
+    if boxSize == 1:
+        if 1 <= outputVal <= maxVal:
+            yield (outputVal,)
+        return
+
+    # Subtraction and division are only ever two cells, so the existing algorithms already
+    # give us everything; we just need both orders.
+    if operator in ('-', '/'):
+        if boxSize != 2:
+            return
+
+        pairs = subtractSet(outputVal, maxVal) if operator == '-' else \
+                divideSet(outputVal, maxVal)
+        for big, small in pairs:
+            if big != small:
+                yield (big, small)
+                yield (small, big)
+            elif not conflicts[1]:
+                yield (big, small)
+        return
+
+    if operator not in ('+', '*'):
+        raise ValueError(f"Unknown operator '{operator}'.")
+
+    adding = (operator == '+')
+
+    # The biggest product k cells can make, for the multiplication cutoff.
+    powers = [maxVal ** k for k in range(boxSize)]
+
+    def candidates(position, remaining):
+        # Numbers that can go in this cell without clashing with its row/column mates and
+        # still leave something the remaining cells can make up.
+        taken = 0
+        for j in conflicts[position]:
+            taken |= 1 << values[j]
+        cellsLeft = boxSize - position - 1
+
+        if adding:
+            low = max(1, remaining - cellsLeft * maxVal)
+            high = min(maxVal, remaining - cellsLeft)
+            return [v for v in range(low, high + 1) if not taken >> v & 1]
+
+        limit = powers[cellsLeft]
+        return [v for v in range(1, min(maxVal, remaining) + 1) \
+                if remaining % v == 0 and remaining // v <= limit and not taken >> v & 1]
+
+    # Depth-first, with an explicit stack of (remaining target, untried numbers) per cell.
+    # The last cell doesn't need a stack entry of its own: whatever's left over is the only
+    # number that can go there, so it's checked directly.
+    last = boxSize - 1
+    values = [0] * boxSize
+    stack = [(outputVal, iter(candidates(0, outputVal)))]
+
+    while stack:
+        remaining, choices = stack[-1]
+        v = next(choices, None)
+
+        if v is None:
+            stack.pop()
+            continue
+
+        position = len(stack) - 1
+        values[position] = v
+        rest = remaining - v if adding else remaining // v
+
+        if position == last - 1:
+            if rest <= maxVal and all(values[j] != rest for j in conflicts[last]):
+                values[last] = rest
+                yield tuple(values)
+        else:
+            stack.append((rest, iter(candidates(position + 1, rest))))
+
+
+def placementSet(operator, outputVal, maxVal, cells):
+    '''
+    Same as iterPlacements, but returns the fills as a list.
+    '''
+    return list(iterPlacements(operator, outputVal, maxVal, cells))
+
+
+def placementShape(cells):
+    '''
+    The cells of a box with their rows and columns renumbered in order of first appearance,
+    as a tuple of (row, col) pairs. Where a box sits on the board doesn't matter to
+    iterPlacements, only which of its cells share a row or column, so every box of the same
+    shape (say, any L of three cells drawn the same way round) gets the same answer.
+
+    Example: [(4, 2), (4, 3), (5, 3)] -> ((0, 0), (0, 1), (1, 1))
+    '''
+    rows = dict()
+    cols = dict()
+    return tuple((rows.setdefault(r, len(rows)), cols.setdefault(c, len(cols))) \
+                 for r, c in cells)
+
+
+def memoPlacementSet(operator, outputVal, maxVal, cells):
+    '''
+    Memoized version of placementSet. The result is a tuple of tuples, cached by the box's
+    placementShape, so boxes of the same shape anywhere on any board share one entry.
+    '''
+    return _memoPlacements(operator, outputVal, maxVal, placementShape(cells))
+
+
+@functools.lru_cache(maxsize = ENUM_CACHE_SIZE)
+def _memoPlacements(operator, outputVal, maxVal, shape):
+    return tuple(iterPlacements(operator, outputVal, maxVal, shape))
+
+
+def fillMasks(fills, maxVal):
+    '''
+    For fills written as bit patterns (1 << (v - 1) for the number v, the way kenken_solver
+    keeps cell domains), masks[position][v]: a number with bit k set wherever the kth fill
+    puts v at that position. Any set of those fills can then be kept as one int with a bit
+    per fill, and narrowed down to what fits a cell with a few ANDs instead of a pass over
+    every fill.
+
+    The masks are built a byte at a time, since setting one bit at a time in a big int
+    copies the whole thing every time.
+    '''
+    boxSize = len(fills[0]) if fills else 0
+    masks = list()
+
+    for position in range(boxSize):
+        buckets = [bytearray((len(fills) + 7) // 8) for _ in range(maxVal + 1)]
+        for k, f in enumerate(fills):
+            buckets[f[position].bit_length()][k >> 3] |= 1 << (k & 7)
+        masks.append(tuple(int.from_bytes(b, 'little') for b in buckets))
+
+    return tuple(masks)
+
+
+def memoPlacementBits(operator, outputVal, maxVal, cells):
+    '''
+    The fills from memoPlacementSet written as bit patterns, along with their fillMasks, as
+    a (fills, masks) tuple. Cached by placementShape the same way.
+    '''
+    return _memoPlacementBits(operator, outputVal, maxVal, placementShape(cells))
+
+
+@functools.lru_cache(maxsize = ENUM_CACHE_SIZE)
+def _memoPlacementBits(operator, outputVal, maxVal, shape):
+    fills = tuple(tuple(1 << (v - 1) for v in f) \
+                  for f in _memoPlacements(operator, outputVal, maxVal, shape))
+    return fills, fillMasks(fills, maxVal)
+
+
+def placementCandidates(operator, outputVal, maxVal, cells):
+    '''
+    For each cell, the sorted list of numbers that appear there in at least one valid fill.
+    '''
+    seen = [set() for _ in cells]
+
+    for fill in iterPlacements(operator, outputVal, maxVal, cells):
+        for position, v in enumerate(fill):
+            seen[position].add(v)
+
+    return [sorted(s) for s in seen]
+
+
+##### PACKED SOLUTION SETS #####
+class PackedSolutionSet():
+    '''
+    A solution set stored as one flat array of bytes, one byte per number, instead of a list
+    of lists. A list of lists spends a few dozen bytes on every number plus an object per
+    solution for the garbage collector to keep an eye on, which adds up fast on big "+"
+    boxes; this is a single object no matter how many solutions it holds.
+
+    Build one from any solution set, or straight from one of the lazy enumerators so the
+    lists never exist at all:
+
+        packed = PackedSolutionSet(iterAddSet(30, 9, 6), 6)
+
+    It behaves like the list it replaces as far as outputSolution and the solvers are
+    concerned: len() counts solutions, iterating gives each one as a list, and an empty set
+    is False. filter, restrict, and intersect all work on the packed bytes and hand back a
+    new PackedSolutionSet.
+    '''
+    __slots__ = ('boxSize', 'data')
+
+    def __init__(self, solutionSet = (), boxSize = None):
+        '''
+        Constructor for PackedSolutionSet. Packs every solution in solutionSet (any iterable
+        of number sequences). boxSize is taken from the first solution if not given, and
+        every solution has to be that long.
+        '''
+        self.data = array('B')
+
+        solutions = iter(solutionSet)
+        if boxSize is None:
+            first = next(solutions, None)
+            if first is None:
+                raise ValueError("Can't tell the box size of an empty solution set; pass "\
+                                 "boxSize.")
+            boxSize = len(first)
+            self.data.extend(first)
+        self.boxSize = boxSize
+
+        for sol in solutions:
+            if len(sol) != boxSize:
+                raise ValueError(f"Solution {list(sol)} doesn't have {boxSize} numbers.")
+            self.data.extend(sol)
+
+
+    @classmethod
+    def _fromData(cls, data, boxSize):
+        packed = cls.__new__(cls)
+        packed.data = data
+        packed.boxSize = boxSize
+        return packed
+
+
+    def __len__(self):
+        return len(self.data) // self.boxSize if self.boxSize else 0
+
+
+    def __getitem__(self, index):
+        if not -len(self) <= index < len(self):
+            raise IndexError("PackedSolutionSet index out of range")
+        start = (index % len(self)) * self.boxSize
+        return self.data[start:start + self.boxSize].tolist()
+
+
+    def __iter__(self):
+        data = self.data
+        k = self.boxSize
+        for start in range(0, len(data), k):
+            yield data[start:start + k].tolist()
+
+
+    def _rows(self):
+        # Each solution as bytes, which compare and hash without building any lists.
+        raw = self.data.tobytes()
+        k = self.boxSize
+        return (raw[start:start + k] for start in range(0, len(raw), k))
+
+
+    def __contains__(self, solution):
+        return len(solution) == self.boxSize and bytes(solution) in self._rows()
+
+
+    def __eq__(self, other):
+        if isinstance(other, PackedSolutionSet):
+            return self.boxSize == other.boxSize and self.data == other.data
+        return NotImplemented
+
+
+    def __repr__(self):
+        return f"PackedSolutionSet({len(self)} solutions of {self.boxSize})"
+
+
+    @property
+    def nbytes(self):
+        '''
+        How much memory the numbers themselves take up.
+        '''
+        return self.data.itemsize * len(self.data)
+
+
+    def filter(self, predicate):
+        '''
+        The solutions for which predicate(solution) is true. predicate gets each solution as
+        a bytes object, which indexes and iterates as numbers just like a list would.
+        '''
+        data = array('B')
+        for row in self._rows():
+            if predicate(row):
+                data.frombytes(row)
+        return PackedSolutionSet._fromData(data, self.boxSize)
+
+
+    def restrict(self, allowed):
+        '''
+        The solutions whose numbers are all allowed where they sit. allowed has one entry per
+        position, each a bitmask with bit v - 1 set if v may go there (the same layout as
+        the cell domains in kenken_solver.py).
+        '''
+        allowed = tuple(allowed)
+        if len(allowed) != self.boxSize:
+            raise ValueError(f"Need {self.boxSize} masks, got {len(allowed)}.")
+        return self.filter(lambda row: all(mask >> (v - 1) & 1 \
+                                           for mask, v in zip(allowed, row)))
+
+
+    def intersect(self, other):
+        '''
+        The solutions that are in both this set and other (a PackedSolutionSet or any other
+        solution set), in this set's order.
+        '''
+        if not isinstance(other, PackedSolutionSet):
+            other = PackedSolutionSet(other, self.boxSize)
+        if other.boxSize != self.boxSize:
+            return PackedSolutionSet._fromData(array('B'), self.boxSize)
+
+        keep = set(other._rows())
+        return self.filter(keep.__contains__)
+
+
+##### BATCH CAGE EVALUATION #####
+# Analysing a whole puzzle means asking the enumerators about every box on it, one Python call
+# at a time. With NumPy around, evaluateCages does them all in one go instead: every way of
+# picking k numbers from 1 to maxVal (largest first) is laid out once in a table along with
+# its sum, product, and how many times each number appears in it, and each box's answer is
+# just the rows of that table matching its target and repeat rules. Every box of the same
+# size on the same board gets matched in a single comparison. The table rows come out in the
+# same order addSet and multiplySet use, so the answers are identical to theirs.
+
+# Tables bigger than this many rows (very big boxes on very big boards) aren't worth
+# building; boxes like that go through the regular enumerators instead.
+COMBO_TABLE_LIMIT = 1 << 17
+
+
+@functools.lru_cache(maxsize = 64)
+def _comboTable(maxVal, boxSize):
+    '''
+    The table described above, for boxSize cells on a maxVal x maxVal board: a dict of
+    NumPy arrays, or None if the table would be too big.
+    '''
+    if math.comb(maxVal + boxSize - 1, boxSize) > COMBO_TABLE_LIMIT:
+        return None
+
+    values = np.array(list(itertools.combinations_with_replacement(range(maxVal, 0, -1),
+                                                                   boxSize)),
+                      dtype = np.uint8).reshape(-1, boxSize)       # (rows, cells)
+    wide = values.astype(np.int64)
+    numbers = np.arange(1, maxVal + 1, dtype = np.uint8)
+    counts = (values[:, :, None] == numbers).sum(axis = 1)         # (rows, maxVal)
+
+    table = {'values': values, 'counts': counts,
+             '+': wide.sum(axis = 1), '*': wide.prod(axis = 1)}
+    if boxSize == 2:
+        table['-'] = wide[:, 0] - wide[:, 1]
+        table['/'] = np.where(wide[:, 0] % wide[:, 1] == 0, wide[:, 0] // wide[:, 1], -1)
+
+    return table
+
+
+@functools.lru_cache(maxsize = 256)
+def _repeatMask(maxVal, boxSize, numRepeats, maxRepeats):
+    '''
+    Which rows of _comboTable(maxVal, boxSize) pass pruneRepeats with these settings (all of
+    them, if numRepeats is None).
+    '''
+    counts = _comboTable(maxVal, boxSize)['counts']
+    if numRepeats is None:
+        return np.ones(len(counts), dtype = bool)
+
+    return ~(counts > maxRepeats).any(axis = 1) & \
+           ((counts >= maxRepeats).sum(axis = 1) <= numRepeats)
+
+
+def _cageSolutions(operator, outputVal, maxVal, boxSize, numRepeats, maxRepeats):
+    # One box the ordinary way, for when the table can't be used.
+    match operator:
+        case '+':
+            return memoAddSet(outputVal, maxVal, boxSize, numRepeats, maxRepeats)
+        case '*':
+            return memoMultiplySet(outputVal, maxVal, boxSize, numRepeats, maxRepeats)
+        case '-':
+            return subtractSet(outputVal, maxVal) if boxSize == 2 else []
+        case '/':
+            return divideSet(outputVal, maxVal) if boxSize == 2 else []
+    raise ValueError(f"Unknown operator '{operator}'.")
+
+
+class CageBatch():
+    '''
+    The answers for a batch of boxes from evaluateCages, all packed into one byte array:
+    box i's solutions sit one after the other, one byte per number, between
+    data[offsets[i]] and data[offsets[i + 1]]. batch[i] gives them as a PackedSolutionSet
+    and batch.count(i) just says how many there are.
+    '''
+    __slots__ = ('data', 'offsets', 'boxSizes')
+
+    def __init__(self, data, offsets, boxSizes):
+        self.data = data
+        self.offsets = offsets
+        self.boxSizes = boxSizes
+
+
+    def __len__(self):
+        return len(self.boxSizes)
+
+
+    def __getitem__(self, index):
+        start, end = self.offsets[index], self.offsets[index + 1]
+        return PackedSolutionSet._fromData(self.data[start:end], self.boxSizes[index])
+
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+
+    def count(self, index):
+        '''
+        How many solutions box index has.
+        '''
+        return (self.offsets[index + 1] - self.offsets[index]) // self.boxSizes[index]
+
+
+def evaluateCages(specs):
+    '''
+    Answers a whole list of boxes at once. Each spec is (operator, outputVal, maxVal,
+    boxSize), optionally followed by numRepeats and maxRepeats as in pruneRepeats (leave
+    them off, or pass None for numRepeats, for no pruning; like subtractSet and divideSet,
+    '-' and '/' boxes ignore them). Returns a CageBatch whose entry i matches what the
+    enumerators would give for spec i.
+
+    Uses NumPy if it's installed (see the notes above); otherwise, or for boxes it can't
+    table, it just asks the enumerators one box at a time.
+    '''
+    specs = [tuple(spec) + (None, 2)[len(spec) - 4:] for spec in specs]
+    boxSizes = [spec[3] for spec in specs]
+    counts = [0] * len(specs)
+    answers = dict() # the boxes answered one at a time
+
+    # Gather up the boxes that can share a table: same board and box size.
+    groups = dict()
+    for i, (operator, outputVal, maxVal, boxSize, numRepeats, maxRepeats) in enumerate(specs):
+        if np is not None and boxSize >= 2 and operator in ('+', '*', '-', '/') and \
+           (boxSize == 2 or operator in ('+', '*')) and \
+           _comboTable(maxVal, boxSize) is not None:
+            groups.setdefault((maxVal, boxSize), list()).append(i)
+        else:
+            answers[i] = _cageSolutions(*specs[i])
+            counts[i] = len(answers[i])
+
+    matches = list()
+    for (maxVal, boxSize), members in groups.items():
+        table = _comboTable(maxVal, boxSize)
+
+        # One row per box, marking the table rows that hit its target...
+        hits = np.empty((len(members), len(table['values'])), dtype = bool)
+        byOperator = dict()
+        byRule = dict()
+        for n, i in enumerate(members):
+            operator, outputVal, _, _, numRepeats, maxRepeats = specs[i]
+            byOperator.setdefault(operator, ([], []))
+            byOperator[operator][0].append(n)
+            byOperator[operator][1].append(outputVal)
+            if numRepeats is not None and operator in ('+', '*'):
+                byRule.setdefault((numRepeats, maxRepeats), list()).append(n)
+
+        for operator, (rows, targets) in byOperator.items():
+            hits[rows] = table[operator][None, :] == np.array(targets)[:, None]
+
+        # ...and pass its repeat rules.
+        for (numRepeats, maxRepeats), rows in byRule.items():
+            hits[rows] &= _repeatMask(maxVal, boxSize, numRepeats, maxRepeats)
+
+        boxRows, tableRows = np.nonzero(hits) # by box, then in table order
+        boxCounts = np.bincount(boxRows, minlength = len(members))
+        for i, count in zip(members, boxCounts.tolist()):
+            counts[i] = count
+        matches.append((members, boxSize, boxRows, tableRows, boxCounts, table['values']))
+
+    offsets = array('q', [0])
+    for count, boxSize in zip(counts, boxSizes):
+        offsets.append(offsets[-1] + count * boxSize)
+
+    if np is None:
+        data = array('B')
+        for i in range(len(specs)):
+            for sol in answers[i]:
+                data.extend(sol)
+        return CageBatch(data, offsets, boxSizes)
+
+    # Copy every group's matches straight to where they belong in the one buffer: match j of
+    # a box goes j solutions past that box's offset.
+    out = np.empty(offsets[-1], dtype = np.uint8)
+    starts = np.frombuffer(offsets, dtype = np.int64)
+    for members, boxSize, boxRows, tableRows, boxCounts, values in matches:
+        firstMatch = np.cumsum(boxCounts) - boxCounts
+        rank = np.arange(len(boxRows)) - firstMatch[boxRows]
+        dest = starts[np.array(members)][boxRows] + rank * boxSize
+        out[dest[:, None] + np.arange(boxSize)] = values[tableRows]
+
+    for i, answer in answers.items():
+        if counts[i]:
+            out[offsets[i]:offsets[i + 1]] = np.array(answer, dtype = np.uint8).ravel()
+
+    data = array('B')
+    data.frombytes(out.tobytes())
+    return CageBatch(data, offsets, boxSizes)
+
+
 ##### PRINT OUT THE SOLUTIONS #####
 def outputSolution(outputVal, operator, solutionSet):
     '''
-    Crafts a text output based on a given solutionSet.
+    Crafts a text output based on a given solutionSet (a list of solutions or a
+    PackedSolutionSet).
 
     If any solutions are found, it will print outputVal followed by a list of each solution
     in descending order of their largest number.
@@ -325,207 +1372,383 @@ def explain_kenken():
 
     get_any_key()
 
-##### MAIN FUNCTION #####
-
-# Introduce ourselves.
-clear()
-
-print("Welcome to the KenKen Possibility Producer!")
-print("")
-print("This will take in various parameters describing a single box within a kenken puzzle")
-print("And determine what possible ways you could arrive at the solution it asks for.")
-print("")
-print("Would you like a further illustration of some examples, or to just get on with it?")
-print("")
-print("")
-
-# Determine if we provide help before getting our parameters.
-while True:
-    response = input("(H)elp or (C)ontinue: ").upper()[0]
-
-    if response not in ('H', 'C'):
-        print("Invalid response!")
-        continue
+##### BATCH MODE #####
+def normalizeQuery(query):
+    '''
+    Checks a box query (see answerQuery for the keys) and returns it in one standard form: a
+    new dictionary with every number made an int, cells either a box size or a list of
+    (row, col) tuples, and numRepeats/maxRepeats set to None wherever they don't apply. The
+    same question always normalizes to the same dictionary, whatever types it came in as.
+
+    Raises ValueError (or KeyError, for a missing key, or TypeError/ArithmeticError for
+    values that aren't numbers at all) if the query doesn't make sense: an unknown
+    operator, a target or size below 1, or cells that aren't distinct [row, col] pairs on
+    the board.
+    '''
+    operator = query['operator']
+    outputVal = int(query['target'])
+    maxVal = int(query['size'])
+    cells = query['cells']
+    numRepeats = maxRepeats = None
+
+    if operator not in ('+', '-', '*', '/'):
+        raise ValueError(f"Unknown operator '{operator}'.")
+    if maxVal < 1:
+        raise ValueError("Puzzle size must be positive.")
+    if outputVal < 1:
+        raise ValueError("Target must be positive.")
+
+    if isinstance(cells, list):
+        cells = [tuple(c) for c in cells]
+        for cell in cells:
+            if len(cell) != 2 or not all(isinstance(x, int) and 0 <= x < maxVal \
+                                         for x in cell):
+                raise ValueError(f"Bad cell {list(cell)}: cells are [row, col] pairs, "
+                                 f"counted from 0, on the board.")
+        if not cells:
+            raise ValueError("Box must contain at least one cell.")
+        if len(set(cells)) != len(cells):
+            raise ValueError("Box lists the same cell twice.")
     else:
-        break
+        cells = int(cells)
+        if operator in ('+', '*'):
+            if cells < 2:
+                raise ValueError("Box must contain at least two cells.")
+            numRepeats = int(query.get('numRepeats', 0))
+            maxRepeats = int(query.get('maxRepeats', 2))
 
-# If requested, give them that help.
-if response == 'H':
-    explain_kenken()
+    return {'operator': operator, 'target': outputVal, 'size': maxVal, 'cells': cells,
+            'numRepeats': numRepeats, 'maxRepeats': maxRepeats}
+
+
+def answerQuery(query):
+    '''
+    Answers one box query given as a dictionary, the non-interactive equivalent of a trip
+    through the main loop. Keys:
+
+        operator    '+', '-', '*', or '/'
+        target      the solution value (outputVal)
+        size        the size of the puzzle (maxVal)
+        cells       either the number of cells in the box (boxSize), or a list of
+                    [row, col] pairs, in which case the answer is every ordered fill from
+                    iterPlacements and the repeat settings are ignored
+        numRepeats  optional, default 0
+        maxRepeats  optional, default 2
+
+    Returns the list of solutions. Raises the same errors as normalizeQuery if the query
+    doesn't make sense.
+    '''
+    query = normalizeQuery(query)
+    operator = query['operator']
+    outputVal = query['target']
+    maxVal = query['size']
+    cells = query['cells']
+
+    if isinstance(cells, list):
+        return [list(fill) for fill in iterPlacements(operator, outputVal, maxVal, cells)]
+
+    boxSize = cells
+    match operator:
+        case '+' | '*':
+            memoSet = memoAddSet if operator == '+' else memoMultiplySet
+            solutionSet = memoSet(outputVal, maxVal, boxSize, query['numRepeats'],
+                                  query['maxRepeats'])
+            return [list(sol) for sol in solutionSet]
+        case '-':
+            return subtractSet(outputVal, maxVal) if boxSize == 2 else []
+        case '/':
+            return divideSet(outputVal, maxVal) if boxSize == 2 else []
 
-# Now, carry on. First things first, we need to know how big the puzzle is. This will,
-# in principle, be a positive integer between 3 and 9. (I suppose it could be bigger but
-# I've never seen a kenken bigger than 9x9.)
-while True:
-    clear()
 
-    smallestKenKen = 3
-    largestKenKen = 9
+def answerJson(query):
+    '''
+    Answers a query (as decoded from JSON) in the shape the batch and server protocols send
+    back: {"solutions": [...]}, or {"error": "..."} if the query was bad. Any "id" is left
+    to the caller. ArithmeticError covers numbers JSON can hold but Python can't make an int
+    of (like 1e400).
+    '''
+    try:
+        return {'solutions': answerQuery(query)}
+    except (ValueError, KeyError, TypeError, ArithmeticError) as e:
+        return {'error': f'{type(e).__name__}: {e}'}
+
+
+# How many answers to hold on to before writing them out in one go.
+BATCH_FLUSH_LINES = 1024
+
+
+def runBatch(inStream, outStream):
+    '''
+    Reads box queries as JSON Lines (one query per line, see answerQuery) from inStream and
+    writes one JSON line per query to outStream: {"solutions": [...]}, or {"error": "..."}
+    if the query was bad. If a query has an "id", it's copied into the answer so results can
+    be matched up. Blank lines are skipped. Returns the number of queries answered.
+
+    Nothing here touches the screen or waits on input, so hundreds of thousands of queries
+    can go through in one process. Output is written in blocks of BATCH_FLUSH_LINES.
+    '''
+    pending = list()
+    count = 0
+
+    for line in inStream:
+        if not line.strip():
+            continue
 
-    maxVal = 0
-    while ((maxVal < smallestKenKen) or (maxVal > largestKenKen)):
         try:
-            maxVal = int(input("How big is the puzzle (e.g., '5' for an 5x5)? "))
-        except ValueError:
-            print("Error: Non-numeric value detected.")
-        except:
-            print("Error: Unknown problem detected.")
+            query = json.loads(line)
+        except ValueError as e:
+            query = None
+            answer = {'error': f'{type(e).__name__}: {e}'}
         else:
-            if ((maxVal < smallestKenKen) or (maxVal > largestKenKen)):
-                print(f"Error: KenKen puzzles must be between {smallestKenKen}x"\
-                      f"{smallestKenKen} and {largestKenKen}x{largestKenKen}.")
-
-    # Next, which operation are we performing? The operator must necessarily be one of four
-    # values: '+', '-', '*', or '/'
-    possibleOps = ('+', '-', '*', '/') # a tuple because we don't want to change it
-    operator = ''
-
-    # The operator should also be precisely one character long.
-    while ((operator not in possibleOps) or (len(operator) != 1)):
-        operator = input("What operation is being performed (+, -, *, or /)? ")
-
-    # Next, based on which operation we're performing, we may or may not need further
-    # information. Specifically, for addition and multiplication, we'll need to know
-    # the size of the box, and information about repetitions.
-    if operator in ('-', '/'):
-        boxSize = 2
-    else:
-        boxSize = 0
-        while (boxSize < 2):
+            answer = answerJson(query)
+
+        if isinstance(query, dict) and 'id' in query:
+            answer = {'id': query['id'], **answer}
+
+        pending.append(json.dumps(answer, separators = (',', ':')) + '\n')
+        count += 1
+
+        if len(pending) >= BATCH_FLUSH_LINES:
+            outStream.writelines(pending)
+            pending.clear()
+
+    outStream.writelines(pending)
+    outStream.flush()
+
+    return count
+
+
+##### MAIN FUNCTION #####
+def main():
+    '''
+    Interactive hint loop. Only runs when this file is executed directly, so the
+    enumerators above can be imported by other modules without side effects.
+    '''
+    # Imported here rather than up top, since kenken_index imports this file.
+    import kenken_index
+    index = kenken_index.sharedIndex()
+
+    # Introduce ourselves.
+    clear()
+
+    print("Welcome to the KenKen Possibility Producer!")
+    print("")
+    print("This will take in various parameters describing a single box within a kenken puzzle")
+    print("And determine what possible ways you could arrive at the solution it asks for.")
+    print("")
+    print("Would you like a further illustration of some examples, or to just get on with it?")
+    print("")
+    print("")
+
+    # Determine if we provide help before getting our parameters.
+    while True:
+        response = input("(H)elp or (C)ontinue: ").upper()[0]
+
+        if response not in ('H', 'C'):
+            print("Invalid response!")
+            continue
+        else:
+            break
+
+    # If requested, give them that help.
+    if response == 'H':
+        explain_kenken()
+
+    # Now, carry on. First things first, we need to know how big the puzzle is. This will,
+    # in principle, be a positive integer between 3 and 9. (I suppose it could be bigger but
+    # I've never seen a kenken bigger than 9x9.)
+    while True:
+        clear()
+
+        smallestKenKen = 3
+        largestKenKen = 9
+
+        maxVal = 0
+        while ((maxVal < smallestKenKen) or (maxVal > largestKenKen)):
             try:
-                boxSize = int(input("How many cells are in the box? "))
+                maxVal = int(input("How big is the puzzle (e.g., '5' for an 5x5)? "))
             except ValueError:
                 print("Error: Non-numeric value detected.")
             except:
                 print("Error: Unknown problem detected.")
             else:
-                if (boxSize < 2):
-                    print("Error: Box must contain at least two cells.")
-
-    # If we have more than two boxes, we need to know how they're arranged. This is a
-    # potentially messy operation, so in lieu of that, we're just gonna ask about permitted
-    # repetitions, because that's probably way easier than figuring it out based on some
-    # complicated pattern of entering cells.
-
-    # First, we'll ask how many sets of repeated numbers can exist in the box. For example,
-    # [8, 6, 1, 1] is one; [7, 7, 1, 1] is two.
-    if (boxSize == 2):
-        numRepeats = 0
-    else:
-        numRepeats = -1
-        while ((numRepeats < 0) or (numRepeats > 3)):
-            try:
-                numRepeats = int(input("How many sets of repeated numbers may exist in "\
-                                       "the box? "))
-            except ValueError:
-                print("Error: Non-numeric value detected.")
-            except:
-                print("Error: Unknown problem detected.")
+                if ((maxVal < smallestKenKen) or (maxVal > largestKenKen)):
+                    print(f"Error: KenKen puzzles must be between {smallestKenKen}x"\
+                          f"{smallestKenKen} and {largestKenKen}x{largestKenKen}.")
+
+        # Next, which operation are we performing? The operator must necessarily be one of four
+        # values: '+', '-', '*', or '/'
+        possibleOps = ('+', '-', '*', '/') # a tuple because we don't want to change it
+        operator = ''
+
+        # The operator should also be precisely one character long.
+        while ((operator not in possibleOps) or (len(operator) != 1)):
+            operator = input("What operation is being performed (+, -, *, or /)? ")
+
+        # Next, based on which operation we're performing, we may or may not need further
+        # information. Specifically, for addition and multiplication, we'll need to know
+        # the size of the box, and information about repetitions.
+        if operator in ('-', '/'):
+            boxSize = 2
+        else:
+            boxSize = 0
+            while (boxSize < 2):
+                try:
+                    boxSize = int(input("How many cells are in the box? "))
+                except ValueError:
+                    print("Error: Non-numeric value detected.")
+                except:
+                    print("Error: Unknown problem detected.")
+                else:
+                    if (boxSize < 2):
+                        print("Error: Box must contain at least two cells.")
+
+        # If we have more than two boxes, we need to know how they're arranged. This is a
+        # potentially messy operation, so in lieu of that, we're just gonna ask about permitted
+        # repetitions, because that's probably way easier than figuring it out based on some
+        # complicated pattern of entering cells.
+
+        # First, we'll ask how many sets of repeated numbers can exist in the box. For example,
+        # [8, 6, 1, 1] is one; [7, 7, 1, 1] is two.
+        if (boxSize == 2):
+            numRepeats = 0
+        else:
+            numRepeats = -1
+            while ((numRepeats < 0) or (numRepeats > 3)):
+                try:
+                    numRepeats = int(input("How many sets of repeated numbers may exist in "\
+                                           "the box? "))
+                except ValueError:
+                    print("Error: Non-numeric value detected.")
+                except:
+                    print("Error: Unknown problem detected.")
+                else:
+                    if ((numRepeats < 0) or (numRepeats > 3)):
+                        print("Error: There are only 0-3 sets of repeated numbers in most "\
+                              "kenkens.")
+
+        # Then, iff numRepeats > 0, we need to know how many times any given number can be
+        # repeated. Usually, it's 2. In fact, I'm going to set 2 as a default and only accept
+        # 3 as an alternative because it's so unusual to even run into this scenario.
+        if (numRepeats != 0):
+            possibleRepeats = ('2', '3') # a tuple because we don't want to change it
+            repeats = input("How many times may the same number be repeated in the box "\
+                            "(default = 2; other valid answer = 3)? ")
+
+            # It should also be precisely one character long.
+            if ((repeats not in possibleRepeats) or (len(repeats) != 1)):
+                print("Invalid input. Using default of 2.")
+                maxRepeats = 2
             else:
-                if ((numRepeats < 0) or (numRepeats > 3)):
-                    print("Error: There are only 0-3 sets of repeated numbers in most "\
-                          "kenkens.")
-
-    # Then, iff numRepeats > 0, we need to know how many times any given number can be
-    # repeated. Usually, it's 2. In fact, I'm going to set 2 as a default and only accept
-    # 3 as an alternative because it's so unusual to even run into this scenario.
-    if (numRepeats != 0):
-        possibleRepeats = ('2', '3') # a tuple because we don't want to change it
-        repeats = input("How many times may the same number be repeated in the box "\
-                        "(default = 2; other valid answer = 3)? ")
-        
-        # It should also be precisely one character long.
-        if ((repeats not in possibleRepeats) or (len(repeats) != 1)):
-            print("Invalid input. Using default of 2.")
-            maxRepeats = 2
+                maxRepeats = int(repeats)
         else:
-            maxRepeats = int(repeats)
+            maxRepeats = 2 # pruneRepeats' default; with numRepeats = 0 it only matters as a bound
 
-    # Now that we have all that, we can finally see what solution we're meant to get. I
-    # asked for all that other info first so we can account for obviously bad answers. For
-    # example, you can't have three numbers that add up to 47, or two numbers that multiply
-    # to 81 if the puzzle is anything less than 9x9.
+        # Now that we have all that, we can finally see what solution we're meant to get. I
+        # asked for all that other info first so we can account for obviously bad answers. For
+        # example, you can't have three numbers that add up to 47, or two numbers that multiply
+        # to 81 if the puzzle is anything less than 9x9.
 
-    # The solution must be a positive integer (i.e., >= 1) regardless. However, for
-    # different operations, we'll set the following loose boundaries:
+        # The solution must be a positive integer (i.e., >= 1) regardless. However, for
+        # different operations, we'll set the following loose boundaries:
 
-    # Addition: minimum of 3 (i.e., 2 + 1); maximum of (N * boxes) - 1 for an NxN puzzle.
-    # Subtraction: minimum of 1 (i.e., 2 - 1); maximum of N - 1
-    # Multiplication: minimum of 2 (i.e., 2 * 1); maximum of (N ^ boxes) - 1
-    # Division: minimum of 2 (i.e., 2 / 1); maximum of N
+        # Addition: minimum of 3 (i.e., 2 + 1); maximum of (N * boxes) - 1 for an NxN puzzle.
+        # Subtraction: minimum of 1 (i.e., 2 - 1); maximum of N - 1
+        # Multiplication: minimum of 2 (i.e., 2 * 1); maximum of (N ^ boxes) - 1
+        # Division: minimum of 2 (i.e., 2 / 1); maximum of N
 
-    # I'm aware that for the addition and multiplication it's more complicated than that,
-    # but I don't know if I care enough to fuss with a more complicated formula based on
-    # the two different repetition variables when the culling algorithm exists here.
-    outputVal = 0
-    lowerBound = 0
-    upperBound = 0
+        # I'm aware that for the addition and multiplication it's more complicated than that,
+        # but I don't know if I care enough to fuss with a more complicated formula based on
+        # the two different repetition variables when the culling algorithm exists here.
+        outputVal = 0
+        lowerBound = 0
+        upperBound = 0
 
-    while True:
-        try:
-            outputVal = int(input("What is the solution value? "))
-        except ValueError:
-            print("Error: Non-numeric value detected.")
-        except:
-            print("Error: Unknown problem detected.")
-        else:
+        while True:
+            try:
+                outputVal = int(input("What is the solution value? "))
+            except ValueError:
+                print("Error: Non-numeric value detected.")
+            except:
+                print("Error: Unknown problem detected.")
+            else:
+                match operator:
+                    case '+':
+                        lowerBound = 3
+                        upperBound = (maxVal * boxSize) - 1
+                    case '-':
+                        lowerBound = 1
+                        upperBound = maxVal - 1
+                    case '*':
+                        lowerBound = 2
+                        upperBound = (maxVal ** boxSize) - 1
+                    case '/':
+                        lowerBound = 2
+                        upperBound = maxVal
+
+                if (outputVal < lowerBound) or (outputVal > upperBound):
+                    print("Error: Solution appears out of bounds. Check parameters and try "\
+                          "again.")
+                    continue
+                else:
+                    break
+
+        # Okay, we finally have everything. If the precomputed index has been built (see
+        # kenken_index.py), the answer is just a lookup away. Otherwise (or if the question is
+        # outside what the index covers), we run the actual algorithms. Yes, the '+' and '*'
+        # could be combined into a single line but I prefer this for the sake of readability.
+        solutionSet = None
+        if index:
+            solutionSet = index.lookup(operator, outputVal, maxVal, boxSize, numRepeats,
+                                       maxRepeats)
+
+        if solutionSet is None:
             match operator:
                 case '+':
-                    lowerBound = 3
-                    upperBound = (maxVal * boxSize) - 1
+                    # Call the addition algorithm, which culls repeats as it goes.
+                    solutionSet = addSet(outputVal, maxVal, boxSize, numRepeats, maxRepeats)
                 case '-':
-                    lowerBound = 1
-                    upperBound = maxVal - 1
+                    # Call the subtraction algorithm. There will be no repeats.
+                    solutionSet = subtractSet(outputVal, maxVal)
                 case '*':
-                    lowerBound = 2
-                    upperBound = (maxVal ** boxSize) - 1
+                    # Call the multiplication algorithm.
+                    solutionSet = multiplySet(outputVal, maxVal, boxSize)
+
+                    # Cull repeats.
+                    solutionSet = pruneRepeats(solutionSet, maxVal, numRepeats, maxRepeats)
                 case '/':
-                    lowerBound = 2
-                    upperBound = maxVal
+                    # Call the division algorithm. There will be no repeats.
+                    solutionSet = divideSet(outputVal, maxVal)
 
-            if (outputVal < lowerBound) or (outputVal > upperBound):
-                print("Error: Solution appears out of bounds. Check parameters and try "\
-                      "again.")
+        # Finally, print out our findings.
+        outputSolution(outputVal, operator, solutionSet)
+
+        # Now, do we want to go again?
+        while True:
+            run_again = input("Run again? (Y/N): ").upper()[0]
+
+            if run_again not in ('Y', 'N'):
                 continue
             else:
                 break
 
-    # Okay, we finally have everything. Now, we just need to run the actual algorithms. Yes,
-    # the '+' and '*' could be combined into a single line but I prefer this for the sake
-    # of readability.
-    match operator:
-        case '+':
-            # Call the addition algorithm.
-            solutionSet = addSet(outputVal, maxVal, boxSize)
-            
-            # Cull repeats.
-            solutionSet = pruneRepeats(solutionSet, maxVal, numRepeats, maxRepeats)
-        case '-':
-            # Call the subtraction algorithm. There will be no repeats.
-            solutionSet = subtractSet(outputVal, maxVal)
-        case '*':
-            # Call the multiplication algorithm.
-            solutionSet = multiplySet(outputVal, maxVal, boxSize)
-            
-            # Cull repeats.
-            solutionSet = pruneRepeats(solutionSet, maxVal, numRepeats, maxRepeats)
-        case '/':
-            # Call the division algorithm. There will be no repeats.
-            solutionSet = divideSet(outputVal, maxVal)
-
-    # Finally, print out our findings.
-    outputSolution(outputVal, operator, solutionSet)
-
-    # Now, do we want to go again?
-    while True:
-        run_again = input("Run again? (Y/N): ").upper()[0]
-
-        if run_again not in ('Y', 'N'):
+        if run_again == 'Y':
             continue
-        else:
+        else: # i.e., run_again == 'N'
             break
 
-    if run_again == 'Y':
-        continue
-    else: # i.e., run_again == 'N'
-        break
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'KenKen Possibility Producer')
+    parser.add_argument('--batch', nargs = '?', const = '-', metavar = 'FILE',
+                        help = 'answer JSON Lines queries from FILE (or stdin, if no FILE '
+                               'or "-") instead of running interactively')
+    args = parser.parse_args()
+
+    if args.batch is None:
+        main()
+    elif args.batch == '-':
+        runBatch(sys.stdin, sys.stdout)
+    else:
+        with open(args.batch) as f:
+            runBatch(f, sys.stdout)
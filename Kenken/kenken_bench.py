@@ -0,0 +1,464 @@
+# Benchmarks for the KenKen enumerators and solving engines. Run it with:
+#
+#     python kenken_bench.py
+#
+# to run the benchmark suite over the fixed corpus in kenken_bench_corpus.json and compare the
+# results against kenken_bench_baseline.json (add --save-baseline to replace the baseline with
+# this run), or with --compare for the head-to-head tables (bounded vs. unbounded addSet, with
+# and without repeat rules, and the solving engines against each other). Nothing here is
+# interactive, so it's safe to run headless.
+
+# Imports
+import argparse
+import gc
+import itertools
+import json
+import math
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+import kenken
+import kenken_generator
+import kenken_solver
+
+# The suite's inputs and the results it compares against live next to this file.
+HERE = os.path.dirname(os.path.abspath(__file__))
+CORPUS_PATH = os.path.join(HERE, 'kenken_bench_corpus.json')
+BASELINE_PATH = os.path.join(HERE, 'kenken_bench_baseline.json')
+
+# Bumped whenever buildCorpus changes what it writes, so results from different corpora
+# never get compared with each other.
+CORPUS_VERSION = 1
+
+
+##### REFERENCE IMPLEMENTATIONS #####
+def addSetUnbounded(outputVal, maxVal, boxSize):
+    '''
+    The original addSet, kept here as a yardstick. It starts every level at maxVal and only
+    checks outputVal > i before recursing, so it wanders into branches where the remaining
+    cells can't possibly make up what's left, and it rebuilds every answer with [i] + a at
+    each level on the way back up.
+    '''
+    solutionSet = list()
+    lastVal = math.ceil(outputVal / boxSize)
+
+    for i in range(maxVal, lastVal - 1, -1):
+        if outputVal > i:
+            if boxSize == 2:
+                solutionSet.append([i, outputVal - i])
+            else:
+                solutionSubSet = addSetUnbounded(outputVal - i, i, boxSize - 1)
+                for a in solutionSubSet:
+                    solutionSet.append([i] + a)
+
+    return solutionSet
+
+
+##### TIMING #####
+def timeIt(function, *args, repeat = 5):
+    '''
+    Best-of-repeat wall time for function(*args), in seconds.
+    '''
+    best = float('inf')
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(*args)
+        best = min(best, time.perf_counter() - start)
+
+    return best
+
+
+def benchAddBounds(maxVal = 9, boxSizes = (7, 8, 9)):
+    '''
+    Times the bound-pruned addSet against addSetUnbounded for every possible target of each
+    box size on a maxVal x maxVal board, checks they agree, and prints a table. Targets are
+    split into thirds: dead branches are mostly a low- and high-target problem, while in the
+    middle the time goes into building the (many) answers.
+    Returns the rows as (boxSize, band, solutions, unbounded seconds, bounded seconds).
+    '''
+    rows = list()
+
+    for boxSize in boxSizes:
+        targets = range(boxSize, boxSize * maxVal + 1)
+        third = -(-len(targets) // 3)
+
+        for band, start in (('low', 0), ('middle', third), ('high', 2 * third)):
+            bandTargets = targets[start:start + third]
+            solutions = 0
+
+            for outputVal in bandTargets:
+                expected = addSetUnbounded(outputVal, maxVal, boxSize)
+                if kenken.addSet(outputVal, maxVal, boxSize) != expected:
+                    raise AssertionError(f"addSet disagrees on {outputVal}+ in {boxSize} "\
+                                         f"cells.")
+                solutions += len(expected)
+
+            def runAll(enumerate_):
+                for outputVal in bandTargets:
+                    enumerate_(outputVal, maxVal, boxSize)
+
+            rows.append((boxSize, f'{band} ({bandTargets[0]}-{bandTargets[-1]})', solutions,
+                         timeIt(runAll, addSetUnbounded), timeIt(runAll, kenken.addSet)))
+
+    print(f"addSet on a {maxVal}x{maxVal} board, all targets per box size")
+    print(f"{'cells':>5} {'targets':>15} {'solutions':>10} {'unbounded ms':>13} " \
+          f"{'bounded ms':>11} {'speedup':>8}")
+    for boxSize, band, solutions, unbounded, bounded in rows:
+        print(f"{boxSize:>5} {band:>15} {solutions:>10} {unbounded * 1000:>13.2f} " \
+              f"{bounded * 1000:>11.2f} {unbounded / bounded:>7.2f}x")
+    print("")
+
+    return rows
+
+
+def benchAddRepeats(maxVal = 9, boxSizes = (7, 8, 9), rules = ((0, 2), (1, 2))):
+    '''
+    The same idea under repeat rules: addSetUnbounded and plain addSet, each followed by
+    pruneRepeats, against addSet with the rule passed in, so the repeat-aware bounds cut
+    branches while it enumerates, and against a cold iterAddSet walk. Every target of each
+    box size on a maxVal x maxVal board; prints a table.
+    Returns the rows as (boxSize, rule, solutions, {method: seconds}).
+    '''
+    rows = list()
+
+    for boxSize in boxSizes:
+        targets = range(boxSize, boxSize * maxVal + 1)
+
+        for numRepeats, maxRepeats in rules:
+            solutions = 0
+            for outputVal in targets:
+                expected = kenken.pruneRepeats(addSetUnbounded(outputVal, maxVal, boxSize),
+                                               maxVal, numRepeats, maxRepeats)
+                if kenken.addSet(outputVal, maxVal, boxSize, numRepeats, maxRepeats) != \
+                   expected:
+                    raise AssertionError(f"addSet disagrees on {outputVal}+ in {boxSize} "\
+                                         f"cells under ({numRepeats}, {maxRepeats}).")
+                solutions += len(expected)
+
+            def pruned(enumerate_):
+                for outputVal in targets:
+                    kenken.pruneRepeats(enumerate_(outputVal, maxVal, boxSize), maxVal,
+                                        numRepeats, maxRepeats)
+
+            def ruled():
+                for outputVal in targets:
+                    kenken.addSet(outputVal, maxVal, boxSize, numRepeats, maxRepeats)
+
+            def walked():
+                kenken.clearEnumCache()
+                for outputVal in targets:
+                    for _ in kenken.iterAddSet(outputVal, maxVal, boxSize, numRepeats,
+                                               maxRepeats):
+                        pass
+
+            rows.append((boxSize, (numRepeats, maxRepeats), solutions,
+                         {'unbounded': timeIt(pruned, addSetUnbounded),
+                          'then prune': timeIt(pruned, kenken.addSet),
+                          'ruled': timeIt(ruled), 'cold walk': timeIt(walked)}))
+
+    methods = list(rows[0][3])
+    print(f"addSet under repeat rules on a {maxVal}x{maxVal} board, all targets (ms)")
+    print(f"{'cells':>5} {'rule':>7} {'solutions':>10} " + \
+          ' '.join(f"{method:>11}" for method in methods) + f" {'speedup':>8}")
+    for boxSize, rule, solutions, timings in rows:
+        print(f"{boxSize:>5} {str(rule):>7} {solutions:>10} " + \
+              ' '.join(f"{timings[method] * 1000:>11.2f}" for method in methods) + \
+              f" {timings['then prune'] / timings['ruled']:>7.2f}x")
+    print("")
+
+    return rows
+
+
+def benchEngines(classes = ((6, 4), (9, 4), (9, 6)), count = 20, seed = 1):
+    '''
+    Times every solving engine in kenken_solver.ENGINES on count generated puzzles from
+    each class of (board size, largest box), checks they agree, and prints a table. Each
+    solve asks for two solutions, as a uniqueness check would, so the engines have to
+    finish the search rather than stop at a lucky first guess.
+    Returns the rows as (size, largest box, {engine: mean seconds per puzzle}).
+    '''
+    rows = list()
+
+    for size, maxBoxSize in classes:
+        rng = random.Random(seed)
+        puzzles = [kenken_generator.generatePuzzle(size, rng, maxBoxSize)[0] \
+                   for _ in range(count)]
+        timings = dict()
+
+        for name, engine in kenken_solver.ENGINES.items():
+            def solveAll():
+                return [list(itertools.islice(engine(size, cages).solutions(), 2)) \
+                        for cages in puzzles]
+            timings[name] = timeIt(solveAll, repeat = 3) / count
+
+        reference = [sorted(itertools.islice(kenken_solver.Solver(size, cages).solutions(), 2))
+                     for cages in puzzles]
+        for name, engine in kenken_solver.ENGINES.items():
+            if [sorted(itertools.islice(engine(size, cages).solutions(), 2)) \
+                for cages in puzzles] != reference:
+                raise AssertionError(f"Engine '{name}' disagrees on {size}x{size} puzzles.")
+
+        rows.append((size, maxBoxSize, timings))
+
+    names = list(kenken_solver.ENGINES)
+    print(f"Solving engines, {count} generated puzzles per class (ms per puzzle)")
+    print(f"{'board':>5} {'box':>4} " + ' '.join(f"{name:>10}" for name in names) + \
+          f" {'fastest':>10}")
+    for size, maxBoxSize, timings in rows:
+        print(f"{size:>3}x{size:<1} {maxBoxSize:>4} " + \
+              ' '.join(f"{timings[name] * 1000:>10.2f}" for name in names) + \
+              f" {min(timings, key = timings.get):>10}")
+    print("")
+
+    return rows
+
+
+##### SUITE #####
+def buildCorpus(path = CORPUS_PATH, seed = 2024):
+    '''
+    Writes the suite's corpus: box queries for boards from 3x3 to 12x12 (including the
+    biggest, slowest boxes a 9x9 board can have) and generated puzzles in size groups. The
+    file is checked in and only ever rebuilt on purpose (bumping CORPUS_VERSION), so every
+    run of the suite times exactly the same work.
+    '''
+    rng = random.Random(seed)
+    queries = list()
+
+    for size in (3, 4, 5, 6, 7, 8, 9, 10, 12):
+        for boxSize in range(2, min(size, 7) + 1):
+            for _ in range(4):
+                values = [rng.randint(1, size) for _ in range(boxSize)]
+                rule = rng.choice([(None, 2), (0, 2), (1, 2), (2, 3)])
+                queries.append(['+', sum(values), size, boxSize, *rule])
+                queries.append(['*', math.prod(values), size, boxSize, *rule])
+
+    # Worst cases: the targets with the most combinations for the biggest boxes.
+    for boxSize in (7, 8, 9):
+        middle = boxSize * 5
+        for outputVal in range(middle - 3, middle + 4):
+            queries.append(['+', outputVal, 9, boxSize, None, 2])
+            queries.append(['+', outputVal, 9, boxSize, 1, 2])
+    for outputVal in (2520, 5040, 10080, 20160, 30240, 40320, 60480, 362880):
+        queries.append(['*', outputVal, 9, 7, None, 2])
+        queries.append(['*', outputVal, 9, 7, 2, 3])
+
+    groups = (('3-5', (3, 4, 5), 4, 10), ('6-7', (6, 7), 4, 10), ('8-9', (8, 9), 4, 10),
+              ('9 big boxes', (9,), 6, 5), ('10-12', (10, 12), 4, 6))
+    puzzles = dict()
+    for name, sizes, maxBoxSize, count in groups:
+        puzzles[name] = [kenken_solver.formatPuzzle(size, kenken_generator.generatePuzzle(
+                             size, rng, maxBoxSize)[0]) \
+                         for size in sizes for _ in range(count)]
+
+    writeCorpus({'version': CORPUS_VERSION, 'queries': queries, 'puzzles': puzzles}, path)
+
+
+def writeCorpus(corpus, path = CORPUS_PATH):
+    '''
+    Writes a corpus as JSON with one query or puzzle per line, so a rebuilt corpus diffs
+    line by line instead of one number per line.
+    '''
+    def dumps(value):
+        return json.dumps(value, separators = (', ', ': '))
+
+    queries = ',\n'.join(f'  {dumps(query)}' for query in corpus['queries'])
+    groups = ',\n'.join(f'  {dumps(name)}: [\n' + \
+                        ',\n'.join(f'   {dumps(line)}' for line in lines) + '\n  ]' \
+                        for name, lines in corpus['puzzles'].items())
+
+    with open(path, 'w') as corpusFile:
+        corpusFile.write(f'{{\n "version": {dumps(corpus["version"])},\n'
+                         f' "queries": [\n{queries}\n ],\n'
+                         f' "puzzles": {{\n{groups}\n }}\n}}\n')
+
+
+def suiteCases(corpus):
+    '''
+    The suite's benchmarks, as a list of (name, setup, run). setup() is called before every
+    timed run and returns the argument for run(arg), which does the work and returns how
+    many operations (queries or puzzles) it got through. Setups clear the enumeration caches
+    so every run starts cold.
+    '''
+    queries = corpus['queries']
+    adds = [q for q in queries if q[0] == '+']
+    multiplies = [q for q in queries if q[0] == '*']
+
+    def cold(arg = None):
+        kenken.clearEnumCache()
+        return arg
+
+    def runAdds(_):
+        for _, outputVal, maxVal, boxSize, _, _ in adds:
+            kenken.addSet(outputVal, maxVal, boxSize)
+        return len(adds)
+
+    def runMultiplies(_):
+        for _, outputVal, maxVal, boxSize, _, _ in multiplies:
+            kenken.multiplySet(outputVal, maxVal, boxSize)
+        return len(multiplies)
+
+    def setupPrune():
+        kenken.clearEnumCache()
+        return [(kenken.addSet(q[1], q[2], q[3]) if q[0] == '+' else \
+                 kenken.multiplySet(q[1], q[2], q[3]), q[2], q[4], q[5]) \
+                for q in queries if q[4] is not None]
+
+    def runPrune(work):
+        for solutionSet, maxVal, numRepeats, maxRepeats in work:
+            kenken.pruneRepeats(solutionSet, maxVal, numRepeats, maxRepeats)
+        return len(work)
+
+    def runBatch(_):
+        kenken.evaluateCages(queries)
+        return len(queries)
+
+    cases = [('addSet', cold, runAdds), ('multiplySet', cold, runMultiplies),
+             ('pruneRepeats', setupPrune, runPrune), ('evaluateCages', cold, runBatch)]
+
+    for group, lines in corpus['puzzles'].items():
+        puzzles = [kenken_solver.parsePuzzle(line)[1:] for line in lines]
+
+        def runSolve(_, puzzles = puzzles):
+            for size, cages in puzzles:
+                kenken_solver.solvePuzzle(size, cages)
+            return len(puzzles)
+
+        cases.append((f'solve {group}', cold, runSolve))
+
+    return cases
+
+
+def measure(setup, run, repeat = 3, minSeconds = 0.5):
+    '''
+    Runs one benchmark. Returns a dict of ops per second (the best of at least repeat timed
+    runs, with more for quick cases until minSeconds of timing is in, since a single short
+    run is at the mercy of whatever else the machine is doing), and the
+    peak memory (KiB) and retained blocks of one more run under tracemalloc, which is kept
+    apart from the timed ones since it slows things down. Retained blocks are the memory
+    blocks still held once the run is over and garbage has been collected, i.e. what
+    caches and leaks hang on to; it is not a count of every allocation made along the way,
+    which tracemalloc can't see (it only tracks blocks that are still alive).
+    '''
+    best = float('inf')
+    runs = 0
+    total = 0.0
+    while runs < repeat or total < minSeconds:
+        arg = setup()
+        start = time.perf_counter()
+        ops = run(arg)
+        elapsed = time.perf_counter() - start
+        best = min(best, elapsed)
+        runs += 1
+        total += elapsed
+
+    arg = setup()
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    tracemalloc.reset_peak()
+    run(arg)
+    peak = tracemalloc.get_traced_memory()[1]
+    gc.collect()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    retainedBlocks = sum(stat.count_diff for stat in after.compare_to(before, 'filename'))
+
+    return {'ops': ops, 'opsPerSec': ops / best, 'peakKiB': peak / 1024,
+            'retainedBlocks': retainedBlocks}
+
+
+def runSuite(corpusPath = CORPUS_PATH, baselinePath = BASELINE_PATH, saveBaseline = False,
+             tolerance = 0.20, repeat = 3):
+    '''
+    Runs every benchmark in the suite, prints a table comparing each against the baseline
+    file (if there is one for this corpus), and optionally saves this run as the new
+    baseline. A case counts as a regression if its ops per second dropped by more than
+    tolerance. Returns (results, list of regressed case names).
+    '''
+    with open(corpusPath) as corpusFile:
+        corpus = json.load(corpusFile)
+    if corpus['version'] != CORPUS_VERSION:
+        raise ValueError(f"Corpus is version {corpus['version']}, expected {CORPUS_VERSION}; "\
+                         f"rebuild it with buildCorpus().")
+
+    baseline = dict()
+    if not saveBaseline and os.path.exists(baselinePath):
+        with open(baselinePath) as baselineFile:
+            stored = json.load(baselineFile)
+        if stored.get('corpusVersion') == CORPUS_VERSION:
+            baseline = stored['cases']
+        else:
+            print("Baseline is for a different corpus version; not comparing.\n")
+
+    results = dict()
+    regressions = list()
+
+    print(f"Benchmark suite, corpus v{CORPUS_VERSION} " \
+          f"(NumPy {'on' if kenken.np is not None else 'off'})")
+    print(f"{'case':<20} {'ops':>6} {'ops/sec':>11} {'peak KiB':>9} {'retained':>11} " \
+          f"{'baseline':>11} {'change':>8}")
+
+    for name, setup, run in suiteCases(corpus):
+        result = measure(setup, run, repeat)
+        results[name] = result
+
+        line = f"{name:<20} {result['ops']:>6} {result['opsPerSec']:>11.1f} " \
+               f"{result['peakKiB']:>9.1f} {result['retainedBlocks']:>11}"
+        if name in baseline:
+            change = result['opsPerSec'] / baseline[name]['opsPerSec'] - 1
+            flag = ''
+            if change < -tolerance:
+                flag = '  SLOWER'
+                regressions.append(name)
+            line += f" {baseline[name]['opsPerSec']:>11.1f} {change:>+7.1%}{flag}"
+        print(line, flush = True)
+    print("")
+
+    if saveBaseline:
+        with open(baselinePath, 'w') as baselineFile:
+            json.dump({'corpusVersion': CORPUS_VERSION,
+                       'python': platform.python_version(),
+                       'machine': platform.machine(),
+                       'numpy': kenken.np is not None,
+                       'cases': {name: {key: round(value, 2) for key, value in \
+                                        result.items()} \
+                                 for name, result in results.items()}},
+                      baselineFile, indent = 1)
+            baselineFile.write('\n')
+        print(f"Saved baseline to {baselinePath}")
+
+    return results, regressions
+
+
+##### MAIN FUNCTION #####
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Benchmark the KenKen enumerators and '
+                                                   'solvers.')
+    parser.add_argument('--save-baseline', action = 'store_true',
+                        help = 'store this run as the new baseline')
+    parser.add_argument('--tolerance', type = float, default = 0.20,
+                        help = 'slowdown that counts as a regression (default: 0.20)')
+    parser.add_argument('--repeat', type = int, default = 3,
+                        help = 'timed runs per case, best one kept (default: 3)')
+    parser.add_argument('--compare', action = 'store_true',
+                        help = 'print the head-to-head tables instead of running the suite')
+    parser.add_argument('--build-corpus', action = 'store_true',
+                        help = 'rewrite the corpus file (only when CORPUS_VERSION changes)')
+    args = parser.parse_args()
+
+    if args.compare:
+        benchAddBounds()
+        benchAddRepeats()
+        benchEngines()
+    elif args.build_corpus:
+        buildCorpus()
+    else:
+        _, regressions = runSuite(saveBaseline = args.save_baseline,
+                                  tolerance = args.tolerance, repeat = args.repeat)
+        if regressions:
+            print(f"Slower than baseline: {', '.join(regressions)}")
+            sys.exit(1)
@@ -0,0 +1,149 @@
+# Corpus runner: solves a whole file of puzzles (one per line, in the text format described
+# in kenken_solver.py) across every core, and streams a JSON line per puzzle to an output
+# file as each one finishes. Run it with:
+#
+#     python kenken_corpus.py puzzles.txt results.jsonl
+#
+# Each result looks like
+#
+#     {"line": 12, "name": "p12", "solution": [[...], ...], "seconds": 0.0041, "nodes": 3}
+#
+# with "solution" set to null for a puzzle that has none, or an "error" in place of the last
+# three for a line that couldn't be read. --stats adds a "stats" object to each result (see
+# SolveStats in kenken_solver.py). Results come out in the order they finish, not the
+# order they went in, which is what "line" is for.
+
+# Imports
+import argparse
+import functools
+import json
+import multiprocessing
+import os
+import threading
+import time
+import kenken_solver
+
+
+##### WORKER #####
+def solveLine(lineNumber, line, engine = 'propagate', withStats = False):
+    '''
+    Parses and solves one line of the corpus with the named engine (see
+    kenken_solver.ENGINES), returning its result as a JSON string. With withStats, the
+    result also carries the solve's kenken_solver.SolveStats under "stats". Nothing a
+    puzzle does gets out of here: any failure becomes its result's "error", so one bad line
+    can't take the rest of the corpus down with it.
+    '''
+    result = {'line': lineNumber}
+
+    try:
+        name, size, cages = kenken_solver.parsePuzzle(line)
+        result['name'] = name
+
+        start = time.perf_counter()
+        stats = kenken_solver.SolveStats() if withStats else None
+        solver = kenken_solver.ENGINES[engine](size, cages, stats)
+        solution = next(solver.solutions(), None)
+        result['solution'] = solution
+        result['seconds'] = round(time.perf_counter() - start, 6)
+        result['nodes'] = solver.nodes
+        if stats is not None:
+            result['stats'] = stats.asDict()
+    except ValueError as e:
+        result['error'] = str(e)
+    except Exception as e: # a bug, or a puzzle weird enough to hit one
+        result['error'] = f'{type(e).__name__}: {e}'
+
+    return json.dumps(result, separators = (',', ':'))
+
+
+def solveChunk(chunk, engine = 'propagate', withStats = False):
+    '''
+    Solves a list of (line number, line) pairs. This is the unit of work a worker process
+    gets, so that the cost of shipping work back and forth is spread over several puzzles.
+    '''
+    return [solveLine(lineNumber, line, engine, withStats) for lineNumber, line in chunk]
+
+
+##### CORPUS #####
+def readChunks(inFile, chunkSize):
+    '''
+    Generator yielding lists of up to chunkSize (line number, line) pairs, skipping blank
+    lines and comments. Line numbers count from 1.
+    '''
+    chunk = list()
+
+    for lineNumber, line in enumerate(inFile, 1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+
+        chunk.append((lineNumber, line))
+        if len(chunk) == chunkSize:
+            yield chunk
+            chunk = list()
+
+    if chunk:
+        yield chunk
+
+
+def solveCorpus(inPath, outPath, workers = None, chunkSize = 32, maxInFlight = None,
+                engine = 'propagate', withStats = False):
+    '''
+    Solves every puzzle in inPath across a pool of worker processes and writes results to
+    outPath as they come in. Returns the number of puzzles processed.
+
+    workers defaults to the number of cores. Work goes out chunkSize puzzles at a time, and
+    at most maxInFlight chunks (default: four per worker) are handed out but not yet
+    written, so neither the parent nor the pool's queues grow with the size of the corpus;
+    the input file is read only as fast as the workers get through it. engine names the
+    solver to use (see kenken_solver.ENGINES), and withStats adds each puzzle's
+    instrumentation to its result.
+    '''
+    if engine not in kenken_solver.ENGINES:
+        raise ValueError(f"Unknown engine '{engine}'.")
+
+    workers = workers or os.cpu_count() or 1
+    maxInFlight = maxInFlight or 4 * workers
+
+    # The pool reads from the chunk generator on a thread of its own and would happily queue
+    # up the entire file. This makes it wait until results have been written first.
+    slots = threading.BoundedSemaphore(maxInFlight)
+
+    def throttled(chunks):
+        for chunk in chunks:
+            slots.acquire()
+            yield chunk
+
+    count = 0
+
+    with open(inPath) as inFile, open(outPath, 'w') as outFile, \
+         multiprocessing.Pool(workers) as pool:
+        work = functools.partial(solveChunk, engine = engine, withStats = withStats)
+        for results in pool.imap_unordered(work, throttled(readChunks(inFile, chunkSize))):
+            outFile.write('\n'.join(results) + '\n')
+            count += len(results)
+            slots.release()
+
+    return count
+
+
+##### MAIN FUNCTION #####
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Solve a file of KenKen puzzles.')
+    parser.add_argument('puzzles', help = 'puzzle file, one puzzle per line')
+    parser.add_argument('results', help = 'where to write the JSON Lines results')
+    parser.add_argument('-j', '--workers', type = int, default = None,
+                        help = 'worker processes (default: one per core)')
+    parser.add_argument('--chunk', type = int, default = 32,
+                        help = 'puzzles per unit of work (default: 32)')
+    parser.add_argument('--engine', choices = list(kenken_solver.ENGINES),
+                        default = 'propagate', help = 'solving engine (default: propagate)')
+    parser.add_argument('--stats', action = 'store_true',
+                        help = 'include search and per-box instrumentation in each result')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    count = solveCorpus(args.puzzles, args.results, args.workers, args.chunk,
+                        engine = args.engine, withStats = args.stats)
+    elapsed = time.perf_counter() - start
+    print(f"Solved {count} puzzles in {elapsed:.2f}s ({count / elapsed:.1f} per second).")
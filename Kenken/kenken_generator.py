@@ -0,0 +1,209 @@
+# KenKen puzzle generator. Builds a random Latin square, carves it into boxes, picks an
+# operator and target for each, and then makes sure the result has exactly one solution.
+# Run it with:
+#
+#     python kenken_generator.py -n 100 -s 6 > puzzles.txt
+#
+# which writes puzzles in the one-line text format from kenken_solver.py, ready for
+# kenken_corpus.py.
+
+# Imports
+import argparse
+import itertools
+import math
+import random
+import kenken
+import kenken_solver
+
+
+##### LATIN SQUARE #####
+def randomLatinSquare(size, rng):
+    '''
+    A random size x size Latin square (every row and column holds 1 to size once each), as
+    a list of rows. Starts from the simple cyclic square and shuffles its rows, columns, and
+    numbers, which is quick and more than random enough for making puzzles.
+    '''
+    rows = list(range(size))
+    cols = list(range(size))
+    numbers = list(range(1, size + 1))
+    rng.shuffle(rows)
+    rng.shuffle(cols)
+    rng.shuffle(numbers)
+
+    return [[numbers[(r + c) % size] for c in cols] for r in rows]
+
+
+##### BOXES #####
+def randomBoxes(size, rng, maxBoxSize = 4):
+    '''
+    Carves the board into connected boxes of 1 to maxBoxSize cells. Returns a list of cell
+    lists, each cell a (row, col) pair. Single cells are kept rare, since they just give the
+    answer away. Raises ValueError if maxBoxSize is less than 2, which would leave nothing
+    but single cells.
+    '''
+    if maxBoxSize < 2:
+        raise ValueError("Boxes have to be allowed at least two cells.")
+
+    owner = dict()
+    boxes = list()
+
+    cells = [(r, c) for r in range(size) for c in range(size)]
+    rng.shuffle(cells)
+
+    for cell in cells:
+        if cell in owner:
+            continue
+
+        box = [cell]
+        owner[cell] = len(boxes)
+        target = rng.randint(2, maxBoxSize)
+
+        # Grow the box one neighbour at a time until it's big enough or boxed in.
+        while len(box) < target:
+            options = [(r + dr, c + dc) for r, c in box \
+                       for dr, dc in ((0, 1), (1, 0), (0, -1), (-1, 0)) \
+                       if 0 <= r + dr < size and 0 <= c + dc < size and \
+                          (r + dr, c + dc) not in owner]
+            if not options:
+                break
+            grown = rng.choice(options)
+            owner[grown] = len(boxes)
+            box.append(grown)
+
+        boxes.append(box)
+
+    return boxes
+
+
+def connectedParts(cells):
+    '''
+    Splits a set of cells into its connected pieces.
+    '''
+    remaining = set(cells)
+    parts = list()
+
+    while remaining:
+        part = [remaining.pop()]
+        for r, c in part: # part grows as we go
+            for neighbour in ((r + 1, c), (r - 1, c), (r, c + 1), (r, c - 1)):
+                if neighbour in remaining:
+                    remaining.remove(neighbour)
+                    part.append(neighbour)
+        parts.append(part)
+
+    return parts
+
+
+##### CLUES #####
+def clueOptions(values, cells, size):
+    '''
+    Every (operator, target, number of fills) that fits a box holding values. The number of
+    fills is how many combinations the enumerators in kenken.py give for that clue, laid out
+    on the box's cells, so a smaller number means a more telling clue.
+    '''
+    if len(values) == 1:
+        return [('=', values[0], 1)]
+
+    cells = tuple(cells)
+
+    options = list()
+    boxSize = len(values)
+
+    total = sum(values)
+    options.append(('+', total, len(kenken.memoPlacementSet('+', total, size, cells))))
+
+    product = math.prod(values)
+    options.append(('*', product, len(kenken.memoPlacementSet('*', product, size, cells))))
+
+    if boxSize == 2:
+        big, small = max(values), min(values)
+        options.append(('-', big - small, 2 * len(kenken.subtractSet(big - small, size))))
+        if big % small == 0 and big != small:
+            options.append(('/', big // small, 2 * len(kenken.divideSet(big // small, size))))
+
+    return options
+
+
+def chooseClue(values, cells, size, rng):
+    '''
+    Picks an operator and target for a box. Usually the most telling one, but not always,
+    or every puzzle would be nothing but division.
+    '''
+    options = clueOptions(values, cells, size)
+
+    if rng.random() < 0.7:
+        operator, target, _ = min(options, key = lambda option: option[2])
+    else:
+        operator, target, _ = rng.choice(options)
+
+    return operator, target
+
+
+##### GENERATOR #####
+def isUnique(size, cages):
+    '''
+    Whether a puzzle has exactly one solution. Returns (unique, the first two solutions
+    found); the search stops as soon as a second one turns up.
+    '''
+    found = list(itertools.islice(kenken_solver.Solver(size, cages).solutions(), 2))
+    return len(found) == 1, found
+
+
+def generatePuzzle(size, rng = None, maxBoxSize = 4):
+    '''
+    Generates a puzzle with exactly one solution. Returns (cages, solution), with cages in
+    the format kenken_solver.Solver takes.
+
+    If the first attempt turns out to have more than one solution, it's patched rather than
+    thrown away: some cell the two solutions disagree on is cut out of its box and given its
+    own one-cell box, with whatever's left of the old box re-clued (and split up, if cutting
+    the cell out broke it in two). Each patch pins down at least one more cell, so this
+    always finishes.
+    '''
+    rng = rng or random.Random()
+    solution = randomLatinSquare(size, rng)
+
+    boxes = randomBoxes(size, rng, maxBoxSize)
+    cages = [chooseClue([solution[r][c] for r, c in box], box, size, rng) + (box,) \
+             for box in boxes]
+
+    while True:
+        unique, found = isUnique(size, cages)
+        if unique:
+            return cages, solution
+
+        # Both solutions satisfy every clue, so they can only disagree on cells that aren't
+        # already pinned down by a one-cell box.
+        first, second = found
+        differing = [(r, c) for r in range(size) for c in range(size) \
+                     if first[r][c] != second[r][c]]
+        cell = rng.choice(differing)
+
+        index = next(i for i, (_, _, box) in enumerate(cages) if cell in box)
+        rest = [other for other in cages[index][2] if other != cell]
+
+        cages[index] = ('=', solution[cell[0]][cell[1]], [cell])
+        for part in connectedParts(rest):
+            cages.append(chooseClue([solution[r][c] for r, c in part], part, size, rng) + \
+                         (part,))
+
+
+##### MAIN FUNCTION #####
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Generate KenKen puzzles.')
+    parser.add_argument('-n', '--count', type = int, default = 10,
+                        help = 'how many puzzles (default: 10)')
+    parser.add_argument('-s', '--size', type = int, default = 6,
+                        help = 'board size (default: 6)')
+    parser.add_argument('--max-box', type = int, default = 4,
+                        help = 'largest box, in cells (default: 4)')
+    parser.add_argument('--seed', type = int, default = None,
+                        help = 'random seed, for repeatable output')
+    args = parser.parse_args()
+    if args.max_box < 2:
+        parser.error("--max-box must be at least 2")
+
+    rng = random.Random(args.seed)
+    for n in range(args.count):
+        cages, _ = generatePuzzle(args.size, rng, args.max_box)
+        print(kenken_solver.formatPuzzle(args.size, cages, f'g{n + 1}'))
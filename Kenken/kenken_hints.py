@@ -0,0 +1,236 @@
+# Incremental hint engine. Where kenken.py answers questions about one box at a time, this
+# keeps track of a whole puzzle while someone is solving it: which numbers are still possible
+# in each cell, and which ways of filling each box are still in play. Entering a number only
+# updates what it actually touches (its row, its column, and the boxes those changes land
+# in), and every change is written to a trail so that taking the number back is just a
+# matter of replaying the trail backwards.
+
+# Imports
+import kenken_solver
+
+
+##### HINT SESSION #####
+class HintSession():
+    '''
+    A puzzle in progress. Give it the board size and boxes in the same format as
+    kenken_solver.Solver, then place() and undo() numbers as the player enters and removes
+    them, asking candidates() and boxFills() for hints along the way.
+
+    Candidates start out as whatever each box's clue allows in each cell. Placing a number
+    then does one round of local tidying up:
+
+      1. The number is the only candidate left in its cell, and is crossed off everywhere
+         else in its row and column.
+      2. Every box that just lost a candidate (the one the cell is in, plus any its row or
+         column mates are in) drops the fills that no longer fit, and its cells are trimmed
+         down to what the remaining fills allow.
+
+    It deliberately stops there rather than chasing every knock-on effect, so the cost of a
+    keystroke depends on what the number touches, not on the size of the puzzle.
+
+    Which of a box's fills are still in play is kept as one big integer with a bit per fill
+    (bit k for the kth fill the solver listed), and the solver's masks (kenken.fillMasks)
+    say which fills put each number in each position. Dropping fills and working out what's
+    left for a cell are then a handful of ANDs, however many fills the box has, and the
+    trail only ever has to remember one integer per box.
+    '''
+    def __init__(self, size, cages):
+        '''
+        Constructor for HintSession. Works out every box's fills (via the solver, which also
+        checks that the boxes tile the board) and the starting candidates.
+        '''
+        solver = kenken_solver.Solver(size, cages)
+
+        self.size = size
+        self._cellCage = solver.cellCage
+        self._cageCells = solver.cageCells
+        self._allFills = solver.cageFills
+        self._alive = [(1 << len(fills)) - 1 for fills in self._allFills]
+        self._fillMasks = solver.cageMasks
+        self._cellPosition = [0] * (size * size)
+        for cells in self._cageCells:
+            for position, cell in enumerate(cells):
+                self._cellPosition[cell] = position
+
+        # Everyone sharing a row or column with each cell.
+        self._peers = [[other for unit in solver.cellUnits[cell] \
+                        for other in solver.units[unit] if other != cell] \
+                       for cell in range(size * size)]
+
+        self._candidates = [0] * (size * size)
+        for c, cells in enumerate(self._cageCells):
+            for position, cell in enumerate(cells):
+                self._candidates[cell] = sum(kenken_solver.valueBit(v) \
+                                             for v in range(1, size + 1) \
+                                             if self._fillMasks[c][position][v])
+
+        self._placed = [0] * (size * size)
+
+        # The trail is a list of (list, index, old value) entries, one per change. Each
+        # placement also pushes (trail length before it, cell) onto _marks, so undo knows
+        # how far back to go.
+        self._trail = list()
+        self._marks = list()
+
+
+    def _cell(self, row, col):
+        '''
+        The index of (row, col), after checking it's on the board (raises ValueError if not).
+        '''
+        if not (0 <= row < self.size and 0 <= col < self.size):
+            raise ValueError(f"({row}, {col}) isn't on a {self.size}x{self.size} board.")
+        return row * self.size + col
+
+
+    def _set(self, array, index, value):
+        '''
+        Changes array[index], remembering the old value on the trail.
+        '''
+        self._trail.append((array, index, array[index]))
+        array[index] = value
+
+
+    def place(self, row, col, value):
+        '''
+        Enters value at (row, col). Returns True if value was still a candidate there, or
+        False if it wasn't (it's entered anyway, since players make mistakes; see
+        conflicts()). Raises ValueError if the cell is off the board or already filled, or
+        value is out of range.
+        '''
+        cell = self._cell(row, col)
+        if self._placed[cell]:
+            raise ValueError(f"Cell ({row}, {col}) already holds {self._placed[cell]}.")
+        if not 1 <= value <= self.size:
+            raise ValueError(f"{value} doesn't fit on a {self.size}x{self.size} board.")
+
+        bit = kenken_solver.valueBit(value)
+        candidates = self._candidates
+        wasCandidate = bool(candidates[cell] & bit)
+
+        self._marks.append((len(self._trail), cell))
+        self._set(self._placed, cell, value)
+        old = candidates[cell]
+        self._set(candidates, cell, bit)
+
+        # Step 1: cross it off in the row and column, noting for each box which of its
+        # cells lost what, as (position in the box, bits lost).
+        cellCage = self._cellCage
+        cellPosition = self._cellPosition
+        lost = {cellCage[cell]: [(cellPosition[cell], old & ~bit)]}
+        for peer in self._peers[cell]:
+            if candidates[peer] & bit:
+                self._set(candidates, peer, candidates[peer] & ~bit)
+                lost.setdefault(cellCage[peer], []).append((cellPosition[peer], bit))
+
+        # Step 2: tidy up the boxes that lost something: drop every fill that puts a lost
+        # number where it was lost, then keep only the numbers some surviving fill still has.
+        for c, changes in lost.items():
+            masks = self._fillMasks[c]
+            gone = 0
+            for position, bits in changes:
+                while bits:
+                    low = bits & -bits
+                    gone |= masks[position][low.bit_length()]
+                    bits ^= low
+
+            alive = self._alive[c]
+            if not alive & gone:
+                continue
+            alive &= ~gone
+            self._set(self._alive, c, alive)
+
+            for position, i in enumerate(self._cageCells[c]):
+                union = 0
+                bits = candidates[i]
+                while bits:
+                    low = bits & -bits
+                    if alive & masks[position][low.bit_length()]:
+                        union |= low
+                    bits ^= low
+                if union != candidates[i]:
+                    self._set(candidates, i, union)
+
+        return wasCandidate
+
+
+    def undo(self):
+        '''
+        Takes back the most recent placement, putting everything it changed back the way it
+        was. Returns the (row, col) it was at, or None if there was nothing to undo.
+        '''
+        if not self._marks:
+            return None
+
+        mark, cell = self._marks.pop()
+        trail = self._trail
+        while len(trail) > mark:
+            array, index, old = trail.pop()
+            array[index] = old
+
+        return divmod(cell, self.size)
+
+
+    def erase(self, row, col):
+        '''
+        Removes the number at (row, col), even if it wasn't the last one entered: everything
+        entered since is undone, then entered again. Raises ValueError if the cell is off the
+        board or empty.
+        '''
+        cell = self._cell(row, col)
+        if not self._placed[cell]:
+            raise ValueError(f"Cell ({row}, {col}) is empty.")
+
+        later = list()
+        while True:
+            _, last = self._marks[-1]
+            value = self._placed[last]
+            self.undo()
+            if last == cell:
+                break
+            later.append((last, value))
+
+        for last, value in reversed(later):
+            self.place(last // self.size, last % self.size, value)
+
+
+    def candidates(self, row, col):
+        '''
+        The numbers still possible at (row, col), in ascending order.
+        '''
+        return kenken_solver.bitValues(self._candidates[self._cell(row, col)])
+
+
+    def boxFills(self, row, col):
+        '''
+        The ways of filling the box (row, col) is in that are still in play, as tuples in the
+        same order as the box's cells.
+        '''
+        c = self._cellCage[self._cell(row, col)]
+        alive = format(self._alive[c], 'b')[::-1]
+        return [tuple(b.bit_length() for b in f) for f, bit in zip(self._allFills[c], alive) \
+                if bit == '1']
+
+
+    def singles(self):
+        '''
+        Every empty cell with only one candidate left, as (row, col, value). These are the
+        easy hints.
+        '''
+        return [(cell // self.size, cell % self.size, d.bit_length()) \
+                for cell, d in enumerate(self._candidates) \
+                if not self._placed[cell] and d and d & (d - 1) == 0]
+
+
+    def conflicts(self):
+        '''
+        Every cell, as (row, col), with no candidates left, which means something entered so
+        far is wrong.
+        '''
+        return [divmod(cell, self.size) for cell, d in enumerate(self._candidates) if not d]
+
+
+    def grid(self):
+        '''
+        The numbers entered so far, as a list of rows with 0 for empty cells.
+        '''
+        return [self._placed[r * self.size:(r + 1) * self.size] for r in range(self.size)]
@@ -0,0 +1,236 @@
+# Precomputed cage-combination index. The whole space of questions the hint generator can be
+# asked is small and fixed (operator, target, board size, box size, and repeat rules), so
+# rather than re-running addSet/multiplySet + pruneRepeats for every query, we can work every
+# answer out once, write them all to a compact binary file, and then just look them up.
+#
+# Build it with:
+#
+#     python kenken_index.py
+#
+# which writes kenken_index.bin next to this file. The hint loop in kenken.py (the only
+# reader) will pick it up automatically if it's there, and quietly fall back to computing
+# things if it isn't. It only stores what the hint loop asks for: answers with a repeat
+# rule already applied.
+
+# Imports
+import itertools
+import math
+import mmap
+import os
+import struct
+import sys
+import kenken
+
+# Where the index lives by default.
+INDEX_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'kenken_index.bin')
+
+# File layout. Everything is little-endian.
+#
+#   Header:   magic, version, largest board, largest box, hash bits, entry count
+#   Slots:    (1 << hash bits) slots of (key, data offset, combination count)
+#   Data:     each combination as boxSize bytes, one byte per digit
+#
+# The slots form an open-addressed hash table (linear probing), so a lookup is one hash and,
+# since the table is kept at most half full, usually just one or two slot reads.
+MAGIC = b'KKIX'
+VERSION = 3 # bumped when the enumerators change what they return, or what gets stored
+HEADER = struct.Struct('<4sHBBII')
+SLOT = struct.Struct('<QII')
+
+# Operators in key order.
+OPERATORS = ('+', '-', '*', '/')
+
+# Every (numRepeats, maxRepeats) pair pruneRepeats gets from the hint loop, which accepts
+# 0-3 for the former and 2 or 3 for the latter.
+REPEAT_RULES = tuple((numRepeats, maxRepeats) for maxRepeats in (2, 3) \
+                     for numRepeats in range(0, 4))
+
+
+##### KEYS #####
+def packKey(operator, outputVal, maxVal, boxSize, numRepeats, maxRepeats):
+    '''
+    Packs a query into a single 64-bit key. The target gets the low 32 bits and everything
+    else is stacked above it. maxVal is always at least 1, so no valid key is ever 0, which
+    is what marks an empty slot.
+    '''
+    opIndex = OPERATORS.index(operator)
+    high = ((((opIndex * 32 + maxVal) * 32 + boxSize) * 8 + numRepeats) * 8) + maxRepeats
+
+    return (high << 32) | outputVal
+
+
+def slotFor(key, hashBits):
+    '''
+    Fibonacci hashing: multiply by 2^64 / golden ratio and keep the top hashBits bits.
+    '''
+    return ((key * 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF) >> (64 - hashBits)
+
+
+##### BUILD #####
+def _targets(operator, maxVal, boxSize):
+    '''
+    Every target worth storing for a given operator, board size, and box size.
+    '''
+    if operator == '+':
+        return range(boxSize, maxVal * boxSize + 1)
+    if operator == '*':
+        products = set()
+        for combo in itertools.combinations_with_replacement(range(1, maxVal + 1), boxSize):
+            products.add(math.prod(combo))
+        return sorted(products)
+    if operator == '-':
+        return range(1, maxVal)
+
+    return range(2, maxVal + 1) # '/'
+
+
+def buildIndex(path = INDEX_PATH, largestKenKen = 9, largestBox = 7):
+    '''
+    Runs the enumerators over every board size from 3 to largestKenKen, every box size from
+    2 to largestBox, every target, and every repeat rule, and writes the results to path.
+    Returns the number of entries written.
+    '''
+    entries = dict()
+
+    for maxVal in range(3, largestKenKen + 1):
+        # Subtraction and division are only ever two cells with no repeats.
+        for operator, enumerate_ in (('-', kenken.subtractSet), ('/', kenken.divideSet)):
+            for outputVal in _targets(operator, maxVal, 2):
+                solutionSet = enumerate_(outputVal, maxVal)
+                entries[packKey(operator, outputVal, maxVal, 2, 0, 2)] = solutionSet
+
+        for operator, enumerate_ in (('+', kenken.addSet), ('*', kenken.multiplySet)):
+            for boxSize in range(2, largestBox + 1):
+                for outputVal in _targets(operator, maxVal, boxSize):
+                    solutionSet = enumerate_(outputVal, maxVal, boxSize)
+                    for numRepeats, maxRepeats in REPEAT_RULES:
+                        key = packKey(operator, outputVal, maxVal, boxSize, numRepeats,
+                                      maxRepeats)
+                        entries[key] = kenken.pruneRepeats(solutionSet, maxVal, numRepeats,
+                                                           maxRepeats)
+
+    # Size the table to be at most half full.
+    hashBits = max(4, (2 * len(entries) - 1).bit_length())
+    capacity = 1 << hashBits
+    slots = bytearray(capacity * SLOT.size)
+    data = bytearray()
+    dataStart = HEADER.size + len(slots)
+
+    for key, solutionSet in entries.items():
+        offset = dataStart + len(data)
+        for combo in solutionSet:
+            data.extend(combo)
+
+        slot = slotFor(key, hashBits)
+        while SLOT.unpack_from(slots, slot * SLOT.size)[0]:
+            slot = (slot + 1) & (capacity - 1)
+        SLOT.pack_into(slots, slot * SLOT.size, key, offset, len(solutionSet))
+
+    # Write to a temporary file and swap it in, so a reader never sees half an index.
+    tempPath = path + '.tmp'
+    with open(tempPath, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, largestKenKen, largestBox, hashBits,
+                            len(entries)))
+        f.write(slots)
+        f.write(data)
+    os.replace(tempPath, path)
+
+    return len(entries)
+
+
+##### LOOKUP #####
+class CageIndex():
+    '''
+    A read-only view of a built index file. The file is memory-mapped rather than read, so
+    opening it costs next to nothing and the OS only pages in the parts that get used.
+    '''
+    def __init__(self, path = INDEX_PATH):
+        '''
+        Constructor for CageIndex. Maps the file and checks the header.
+        '''
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+
+        magic, version, self.largestKenKen, self.largestBox, self._hashBits, self.entries = \
+            HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            self._map.close()
+            raise ValueError(f"{path} is not a version {VERSION} KenKen index.")
+
+        self._mask = (1 << self._hashBits) - 1
+
+
+    def close(self):
+        '''
+        Unmaps the file.
+        '''
+        self._map.close()
+
+
+    def covers(self, maxVal, boxSize):
+        '''
+        Whether queries for this board and box size were included when the index was built.
+        '''
+        return 3 <= maxVal <= self.largestKenKen and 2 <= boxSize <= self.largestBox
+
+
+    def lookup(self, operator, outputVal, maxVal, boxSize, numRepeats = 0, maxRepeats = 2):
+        '''
+        Returns the same list of lists the enumerators (plus pruneRepeats, for '+' and '*')
+        would, or None if the query is outside what the index was built for, in which case
+        the caller should compute it directly.
+        '''
+        if operator in ('-', '/'):
+            if boxSize != 2:
+                return []
+            numRepeats, maxRepeats = 0, 2
+
+        if not self.covers(maxVal, boxSize) or not 0 < outputVal < (1 << 32) or \
+           (numRepeats, maxRepeats) not in REPEAT_RULES:
+            return None
+
+        key = packKey(operator, outputVal, maxVal, boxSize, numRepeats, maxRepeats)
+        slot = slotFor(key, self._hashBits)
+        base = HEADER.size
+        while True:
+            slotKey, offset, count = SLOT.unpack_from(self._map, base + slot * SLOT.size)
+            if slotKey == key:
+                break
+            if slotKey == 0:
+                # Every product of boxSize numbers was stored, so for '*' this is a target
+                # nothing can produce. Anything else is a target outside the range the hint
+                # loop accepts, so let the caller work it out.
+                return [] if operator == '*' else None
+            slot = (slot + 1) & self._mask
+
+        raw = self._map[offset:offset + count * boxSize]
+        return [list(raw[i:i + boxSize]) for i in range(0, len(raw), boxSize)]
+
+
+# Shared index for the hint loop (and anything else that wants it), opened on first use.
+_sharedIndex = None
+_sharedTried = False
+
+
+def sharedIndex():
+    '''
+    Returns the CageIndex at INDEX_PATH, opening it the first time it's asked for, or None if
+    it hasn't been built (or can't be read).
+    '''
+    global _sharedIndex, _sharedTried
+
+    if not _sharedTried:
+        _sharedTried = True
+        try:
+            _sharedIndex = CageIndex()
+        except (OSError, ValueError):
+            _sharedIndex = None
+
+    return _sharedIndex
+
+
+##### MAIN FUNCTION #####
+if __name__ == '__main__':
+    path = sys.argv[1] if len(sys.argv) > 1 else INDEX_PATH
+    count = buildIndex(path)
+    print(f"Wrote {count} entries to {path} ({os.path.getsize(path)} bytes).")
@@ -0,0 +1,166 @@
+# Load test for kenken_server.py. Opens a number of client connections, has each one keep a
+# window of queries in flight at once, and reports latency percentiles and throughput. Run it
+# against a server that's already up:
+#
+#     python kenken_loadtest.py --clients 32 --queries 2000 --pipeline 8
+#
+# or add --spawn to have it start (and afterwards stop) a server of its own.
+
+# Imports
+import argparse
+import asyncio
+import json
+import random
+import subprocess
+import sys
+import time
+import kenken_server
+
+
+##### QUERIES #####
+def randomQuery(rng, maxSize = 9):
+    '''
+    A random but sensible box query: a board size, an operator, a box size that suits it,
+    and a target that box could actually make, so most answers aren't empty.
+    '''
+    size = rng.randint(3, maxSize)
+    operator = rng.choice('+-*/')
+
+    if operator in '-/':
+        boxSize = 2
+    else:
+        boxSize = rng.randint(2, min(size, 5))
+
+    values = [rng.randint(1, size) for _ in range(boxSize)]
+    match operator:
+        case '+':
+            target = sum(values)
+        case '*':
+            target = 1
+            for v in values:
+                target *= v
+        case '-':
+            target = max(1, abs(values[0] - values[1]))
+        case '/':
+            target = rng.randint(2, max(2, size // 2))
+
+    return {'operator': operator, 'target': target, 'size': size, 'cells': boxSize,
+            'numRepeats': rng.choice((0, 0, 1)), 'maxRepeats': 2}
+
+
+##### CLIENTS #####
+async def runClient(host, port, queries, pipeline, latencies):
+    '''
+    Sends queries down one connection, keeping up to pipeline of them unanswered at a time,
+    and appends each one's round-trip time (in seconds) to latencies.
+    '''
+    reader, writer = await asyncio.open_connection(host, port, limit = 1 << 24)
+    window = asyncio.Semaphore(pipeline)
+    sentAt = list()
+
+    async def send():
+        for n, query in enumerate(queries):
+            await window.acquire()
+            sentAt.append(time.perf_counter())
+            writer.write(json.dumps({'id': n, **query}).encode() + b'\n')
+            await writer.drain()
+
+    async def receive():
+        for n in range(len(queries)):
+            line = await reader.readline()
+            latencies.append(time.perf_counter() - sentAt[n])
+            window.release()
+            if json.loads(line).get('id') != n:
+                raise RuntimeError(f"Answer {n} came back out of order.")
+
+    await asyncio.gather(send(), receive())
+    writer.close()
+    await writer.wait_closed()
+
+
+def percentile(sortedValues, fraction):
+    '''
+    The value fraction of the way through an already-sorted list (nearest rank).
+    '''
+    index = min(len(sortedValues) - 1, max(0, round(fraction * len(sortedValues)) - 1))
+    return sortedValues[index]
+
+
+async def loadTest(host, port, clients = 16, queries = 1000, pipeline = 8, distinct = 500,
+                   seed = 1):
+    '''
+    Runs clients connections of queries queries each, drawn from a pool of distinct
+    different ones (so, like real use, some questions come up again and again). Returns
+    (number of queries, seconds, sorted latencies).
+    '''
+    rng = random.Random(seed)
+    pool = [randomQuery(rng) for _ in range(distinct)]
+    workloads = [[rng.choice(pool) for _ in range(queries)] for _ in range(clients)]
+    latencies = list()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(runClient(host, port, work, pipeline, latencies) \
+                           for work in workloads))
+    elapsed = time.perf_counter() - start
+
+    return len(latencies), elapsed, sorted(latencies)
+
+
+async def waitForServer(host, port, timeout = 10):
+    '''
+    Keeps trying to connect until the server answers or timeout seconds go by.
+    '''
+    deadline = time.perf_counter() + timeout
+    while True:
+        try:
+            _, writer = await asyncio.open_connection(host, port)
+            writer.close()
+            await writer.wait_closed()
+            return
+        except OSError:
+            if time.perf_counter() > deadline:
+                raise
+            await asyncio.sleep(0.05)
+
+
+##### MAIN FUNCTION #####
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Load test the KenKen hint server.')
+    parser.add_argument('--host', default = kenken_server.DEFAULT_HOST)
+    parser.add_argument('--port', type = int, default = kenken_server.DEFAULT_PORT)
+    parser.add_argument('--clients', type = int, default = 16,
+                        help = 'concurrent connections (default: 16)')
+    parser.add_argument('--queries', type = int, default = 1000,
+                        help = 'queries per connection (default: 1000)')
+    parser.add_argument('--pipeline', type = int, default = 8,
+                        help = 'queries each connection keeps in flight (default: 8)')
+    parser.add_argument('--distinct', type = int, default = 500,
+                        help = 'size of the pool queries are drawn from (default: 500)')
+    parser.add_argument('--seed', type = int, default = 1)
+    parser.add_argument('--spawn', action = 'store_true',
+                        help = 'start a server for the test instead of using a running one')
+    args = parser.parse_args()
+
+    server = None
+    if args.spawn:
+        server = subprocess.Popen([sys.executable, kenken_server.__file__, '--host',
+                                   args.host, '--port', str(args.port)],
+                                  stdout = subprocess.DEVNULL)
+
+    try:
+        if server is not None:
+            asyncio.run(waitForServer(args.host, args.port))
+        count, elapsed, latencies = asyncio.run(loadTest(args.host, args.port, args.clients,
+                                                         args.queries, args.pipeline,
+                                                         args.distinct, args.seed))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    print(f"{count} queries over {args.clients} connections ({args.pipeline} in flight " \
+          f"each) in {elapsed:.2f}s")
+    print(f"{count / elapsed:,.0f} queries per second")
+    print(f"latency p50 {percentile(latencies, 0.50) * 1000:.2f} ms, " \
+          f"p99 {percentile(latencies, 0.99) * 1000:.2f} ms, " \
+          f"max {latencies[-1] * 1000:.2f} ms")
@@ -0,0 +1,275 @@
+# Difficulty rater. Rather than timing a computer solve (which says more about the computer
+# than the puzzle), this solves the puzzle the way a person would: it only ever uses the
+# easiest deduction that gets anywhere, and writes down which ones it needed and how often.
+# A puzzle that falls to box arithmetic and singles is easy; one that needs line/box
+# interplay is harder; one where the deductions run dry and a guess is needed is the hardest.
+# Run it with:
+#
+#     python kenken_rater.py puzzles.txt
+#
+# which prints a JSON line per puzzle, like
+#
+#     {"line": 3, "name": "g3", "techniques": {...}, "hardest": "hidden single",
+#      "grade": "medium", "score": 142}
+#
+# and a count of each grade at the end.
+
+# Imports
+import argparse
+import collections
+import itertools
+import json
+import sys
+import kenken_solver
+
+# The ladder, easiest first, as (name, weight, grade). The weight is what each use adds to
+# the score, and the grade is what a puzzle gets if this is the hardest thing it needed.
+#
+#     single combination      a box with only one way left to fill it
+#     naked single            a settled cell rules its number out of its row and column
+#     cage combinations       a cell can only hold what its box's fills allow
+#     hidden single           a number with only one home left in a line
+#     cage/line intersection  a box that must put a number in a line keeps it out of the
+#                             rest of that line
+#     naked pair              two cells in a line with the same two options
+#     search                  nothing else works: guess
+TECHNIQUES = [('single combination', 1, 'easy'), ('naked single', 1, 'easy'),
+              ('cage combinations', 2, 'easy'), ('hidden single', 3, 'medium'),
+              ('cage/line intersection', 6, 'hard'), ('naked pair', 8, 'hard'),
+              ('search', 25, 'expert')]
+
+GRADES = ('easy', 'medium', 'hard', 'expert')
+
+
+##### RATER #####
+class Rater():
+    '''
+    Rates one puzzle. Give it the board size and boxes in the same format as
+    kenken_solver.Solver; rate() does the rest.
+
+    The box fills come from kenken_solver.Solver (and so from the memoized enumerators in
+    kenken.py), so rating a pile of puzzles only ever works out a given box shape once.
+    '''
+    def __init__(self, size, cages):
+        '''
+        Constructor for Rater. Works out the box fills and the puzzle's solution, which the
+        search rung needs in order to guess right. Raises ValueError if the puzzle doesn't
+        have exactly one solution.
+        '''
+        solver = kenken_solver.Solver(size, cages)
+        found = list(itertools.islice(solver.solutions(), 2))
+        if len(found) != 1:
+            raise ValueError("Puzzle has no solution." if not found else \
+                             "Puzzle has more than one solution.")
+
+        self.size = size
+        self.solution = [v for row in found[0] for v in row]
+        self.cellCage = solver.cellCage
+        self.cageCells = solver.cageCells
+        self.units = solver.units
+
+        # For the box/line rung: each box's cells, grouped by the row or column they're in.
+        self.cageLines = list()
+        for cells in self.cageCells:
+            lines = collections.defaultdict(list)
+            for position, cell in enumerate(cells):
+                lines[cell // size].append(position)
+                lines[size + cell % size].append(position)
+            self.cageLines.append([(unit, positions, set(cells)) \
+                                   for unit, positions in lines.items()])
+
+        self.domains = [solver.full] * (size * size)
+        self.fills = list(solver.cageFills)
+        self.dirty = set(range(len(self.fills)))
+
+        self.ladder = [self.singleCombination, self.nakedSingle, self.cageCombinations,
+                       self.hiddenSingle, self.cageLineIntersection, self.nakedPair,
+                       self.search]
+
+
+    def _narrow(self, cell, mask):
+        '''
+        Restricts a cell to mask, flagging its box to be re-checked. Returns True if that
+        changed anything.
+        '''
+        newMask = self.domains[cell] & mask
+        if newMask == self.domains[cell]:
+            return False
+
+        self.domains[cell] = newMask
+        self.dirty.add(self.cellCage[cell])
+        return True
+
+
+    def _refresh(self):
+        # Bookkeeping rather than a technique: drop the box fills that no longer fit.
+        while self.dirty:
+            c = self.dirty.pop()
+            cellDomains = [self.domains[i] for i in self.cageCells[c]]
+            self.fills[c] = [f for f in self.fills[c] \
+                             if all(d & b for d, b in zip(cellDomains, f))]
+
+
+    # The techniques. Each one applies every deduction of its kind it can find right now and
+    # returns how many cells it changed.
+
+    def singleCombination(self):
+        changed = 0
+        for c, fills in enumerate(self.fills):
+            if len(fills) == 1:
+                for cell, b in zip(self.cageCells[c], fills[0]):
+                    changed += self._narrow(cell, b)
+        return changed
+
+
+    def nakedSingle(self):
+        changed = 0
+        for unit in self.units:
+            for cell in unit:
+                d = self.domains[cell]
+                if d & (d - 1) == 0:
+                    for other in unit:
+                        if other != cell:
+                            changed += self._narrow(other, ~d)
+        return changed
+
+
+    def cageCombinations(self):
+        changed = 0
+        for c, fills in enumerate(self.fills):
+            for position, cell in enumerate(self.cageCells[c]):
+                union = 0
+                for f in fills:
+                    union |= f[position]
+                changed += self._narrow(cell, union)
+        return changed
+
+
+    def hiddenSingle(self):
+        changed = 0
+        for unit in self.units:
+            seenOnce = 0
+            seenTwice = 0
+            for cell in unit:
+                d = self.domains[cell]
+                seenTwice |= seenOnce & d
+                seenOnce |= d
+
+            hidden = seenOnce & ~seenTwice
+            if hidden:
+                for cell in unit:
+                    d = self.domains[cell] & hidden
+                    if d and d & (d - 1) == 0:
+                        changed += self._narrow(cell, d)
+        return changed
+
+
+    def cageLineIntersection(self):
+        changed = 0
+        for c, fills in enumerate(self.fills):
+            for unit, positions, cageCells in self.cageLines[c]:
+                # The numbers every remaining fill puts somewhere in this line.
+                required = -1
+                for f in fills:
+                    placed = 0
+                    for position in positions:
+                        placed |= f[position]
+                    required &= placed
+
+                if required > 0:
+                    for cell in self.units[unit]:
+                        if cell not in cageCells:
+                            changed += self._narrow(cell, ~required)
+        return changed
+
+
+    def nakedPair(self):
+        changed = 0
+        for unit in self.units:
+            pairs = collections.defaultdict(list)
+            for cell in unit:
+                if self.domains[cell].bit_count() == 2:
+                    pairs[self.domains[cell]].append(cell)
+
+            for d, cells in pairs.items():
+                if len(cells) == 2:
+                    for other in unit:
+                        if other not in cells:
+                            changed += self._narrow(other, ~d)
+        return changed
+
+
+    def search(self):
+        # Settle the open cell with the fewest options, the way a person would pick where to
+        # guess, and (since we know the answer) guess right.
+        openCells = [cell for cell, d in enumerate(self.domains) if d & (d - 1)]
+        if not openCells:
+            return 0
+        cell = min(openCells, key = lambda cell: self.domains[cell].bit_count())
+        return self._narrow(cell, kenken_solver.valueBit(self.solution[cell]))
+
+
+    def rate(self):
+        '''
+        Solves the puzzle with the ladder and returns the rating as a dictionary:
+
+            techniques  how many cells each technique changed, for those it needed
+            hardest     the hardest technique it needed
+            grade       'easy', 'medium', 'hard', or 'expert', from the hardest technique
+            score       the sum of each technique's weight times its uses
+        '''
+        counts = collections.Counter()
+
+        while any(d & (d - 1) for d in self.domains):
+            self._refresh()
+            for (name, _, _), technique in zip(TECHNIQUES, self.ladder):
+                changed = technique()
+                if changed:
+                    counts[name] += changed
+                    break
+            else:
+                raise RuntimeError("No technique made progress.") # search always does
+
+        used = [n for n, (name, _, _) in enumerate(TECHNIQUES) if counts[name]]
+        hardest = TECHNIQUES[max(used)] if used else TECHNIQUES[0]
+
+        return {'techniques': {name: counts[name] for name, _, _ in TECHNIQUES \
+                               if counts[name]},
+                'hardest': hardest[0],
+                'grade': hardest[2],
+                'score': sum(weight * counts[name] for name, weight, _ in TECHNIQUES)}
+
+
+def ratePuzzle(size, cages):
+    '''
+    Rates a puzzle. See Rater.rate for what comes back.
+    '''
+    return Rater(size, cages).rate()
+
+
+##### MAIN FUNCTION #####
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Rate KenKen puzzles by difficulty.')
+    parser.add_argument('puzzles', nargs = '?', default = '-',
+                        help = 'puzzle file, one puzzle per line (default: stdin)')
+    args = parser.parse_args()
+
+    inFile = sys.stdin if args.puzzles == '-' else open(args.puzzles)
+    grades = collections.Counter()
+
+    for lineNumber, line in enumerate(inFile, 1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+
+        result = {'line': lineNumber}
+        try:
+            name, size, cages = kenken_solver.parsePuzzle(line)
+            result['name'] = name
+            result.update(ratePuzzle(size, cages))
+            grades[result['grade']] += 1
+        except ValueError as e:
+            result['error'] = str(e)
+        print(json.dumps(result, separators = (',', ':')))
+
+    print(', '.join(f"{grade}: {grades[grade]}" for grade in GRADES), file = sys.stderr)
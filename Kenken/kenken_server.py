@@ -0,0 +1,198 @@
+# Hint server: answers box queries over a socket on localhost, so other tools can ask for
+# hints without running the interactive script or starting a process per question. Run it
+# with:
+#
+#     python kenken_server.py --port 8765
+#
+# The protocol is the same JSON Lines used by kenken.py --batch: send one query per line
+#
+#     {"id": 7, "operator": "+", "target": 12, "size": 6, "cells": 3, "numRepeats": 0}
+#
+# and get one line back per query, in the order they were sent:
+#
+#     {"id": 7, "solutions": [[6, 5, 1], [6, 4, 2], [5, 4, 3]]}
+#
+# or {"error": "..."} for a bad query. "cells" can also be a list of [row, col] pairs. There
+# is no need to wait for an answer before sending the next query; a client can keep as many
+# in flight on one connection as it likes, and any number of clients can connect at once.
+#
+# Answers are worked out on a worker thread, off the event loop, so one slow query doesn't
+# hold up every other client. Queries are still capped (see the limits below), after the same
+# checks kenken.py --batch does, so a number sent as a string is held to them too.
+
+# Imports
+import argparse
+import asyncio
+import collections
+import json
+import kenken
+
+# Where the server listens unless told otherwise.
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+
+# How much ready-encoded answer text to keep in front of the enumerators, in bytes. Answers
+# longer than MAX_CACHED_ANSWER are worked out fresh every time rather than pushing dozens
+# of small ones out of the cache.
+ANSWER_CACHE_BYTES = 64 << 20
+MAX_CACHED_ANSWER = 64 << 10
+
+# The biggest queries the server takes. A box given as a list of cells gets every ordered
+# fill, which grows much faster than the unordered ones: six cells on a 9x9 board can take
+# around 50 ms, seven nearly a second.
+MAX_QUERY_SIZE = 9
+MAX_QUERY_CELLS = 9
+MAX_PLACED_CELLS = 6
+
+
+##### ANSWERS #####
+class AnswerCache:
+    '''
+    Least recently used answers, keyed by queryKey, bounded by the total length of the
+    answers it holds rather than by how many there are. Only touched from the event loop.
+    '''
+    def __init__(self, maxBytes = ANSWER_CACHE_BYTES, maxEntry = MAX_CACHED_ANSWER):
+        self.maxBytes = maxBytes
+        self.maxEntry = maxEntry
+        self.entries = collections.OrderedDict()
+        self.size = 0
+
+    def get(self, key):
+        body = self.entries.get(key)
+        if body is not None:
+            self.entries.move_to_end(key)
+        return body
+
+    def put(self, key, body):
+        if len(body) > self.maxEntry or key in self.entries:
+            return
+        self.entries[key] = body
+        self.size += len(body)
+        while self.size > self.maxBytes:
+            _, old = self.entries.popitem(last = False)
+            self.size -= len(old)
+
+
+answerCache = AnswerCache()
+
+
+def queryKey(query):
+    '''
+    The cache key for a query that's been through kenken.normalizeQuery: its JSON with the
+    keys sorted, so the same question asked by different clients (or in a different order,
+    or with numbers as strings) hits the same entry.
+    '''
+    return json.dumps(query, sort_keys = True, separators = (',', ':'))
+
+
+def checkQuery(query):
+    '''
+    Normalizes a query (see kenken.normalizeQuery, which raises if it's bad) and checks it
+    against the server's limits, raising ValueError if it's over them.
+    '''
+    if not isinstance(query, dict):
+        raise TypeError("Query must be a JSON object.")
+    query = kenken.normalizeQuery(query)
+
+    cells = query['cells']
+    if query['size'] > MAX_QUERY_SIZE:
+        raise ValueError(f"Puzzle size is limited to {MAX_QUERY_SIZE}.")
+    if isinstance(cells, list) and len(cells) > MAX_PLACED_CELLS:
+        raise ValueError(f"Boxes given as cell lists are limited to {MAX_PLACED_CELLS} cells.")
+    if isinstance(cells, int) and cells > MAX_QUERY_CELLS:
+        raise ValueError(f"Boxes are limited to {MAX_QUERY_CELLS} cells.")
+    return query
+
+
+def encodeAnswer(query):
+    '''
+    The answer to a checked query, encoded and minus the braces so an "id" can be spliced in
+    front. This is the slow part, and runs on a worker thread.
+    '''
+    answer = kenken.answerJson(query)
+    return json.dumps(answer, separators = (',', ':'))[1:-1]
+
+
+async def respond(line):
+    '''
+    Turns one line of a client's input into the line to send back, as bytes. Never raises:
+    whatever goes wrong with a query becomes its error line, so the connection (and the
+    queries pipelined behind it) carries on.
+    '''
+    try:
+        query = json.loads(line)
+    except ValueError as e:
+        error = {'error': f'{type(e).__name__}: {e}'}
+        return json.dumps(error, separators = (',', ':')).encode() + b'\n'
+
+    try:
+        checked = checkQuery(query)
+        key = queryKey(checked)
+        body = answerCache.get(key)
+        if body is None:
+            loop = asyncio.get_running_loop()
+            body = await loop.run_in_executor(None, encodeAnswer, checked)
+            answerCache.put(key, body)
+    except Exception as e:
+        error = {'error': f'{type(e).__name__}: {e}'}
+        body = json.dumps(error, separators = (',', ':'))[1:-1]
+
+    if isinstance(query, dict) and 'id' in query:
+        body = '"id":' + json.dumps(query['id'], separators = (',', ':')) + ',' + body
+
+    return ('{' + body + '}\n').encode()
+
+
+##### SERVER #####
+async def handleClient(reader, writer):
+    '''
+    Serves one connection until the client hangs up. Queries are answered in the order they
+    arrive, so pipelined answers come back in order too; other connections carry on while
+    this one waits on a slow answer.
+    '''
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            if not line.strip():
+                continue
+
+            writer.write(await respond(line))
+
+            # Only actually waits if the client has stopped reading and the send buffer has
+            # filled up, which keeps a slow reader from eating all our memory.
+            await writer.drain()
+    except (ConnectionError, asyncio.LimitOverrunError, ValueError):
+        pass # the client went away, or sent a line too long to be a query
+    finally:
+        writer.close()
+
+
+async def serve(host = DEFAULT_HOST, port = DEFAULT_PORT, ready = None):
+    '''
+    Runs the server until cancelled. If ready is an asyncio.Event, it's set once the server
+    is listening.
+    '''
+    server = await asyncio.start_server(handleClient, host, port, limit = 1 << 20)
+
+    async with server:
+        if ready is not None:
+            ready.set()
+        await server.serve_forever()
+
+
+##### MAIN FUNCTION #####
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Serve KenKen box hints over JSON Lines.')
+    parser.add_argument('--host', default = DEFAULT_HOST,
+                        help = f'address to listen on (default: {DEFAULT_HOST})')
+    parser.add_argument('--port', type = int, default = DEFAULT_PORT,
+                        help = f'port to listen on (default: {DEFAULT_PORT})')
+    args = parser.parse_args()
+
+    print(f"Serving KenKen hints on {args.host}:{args.port}", flush = True)
+    try:
+        asyncio.run(serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
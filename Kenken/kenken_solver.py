@@ -0,0 +1,642 @@
+# This is a full-board KenKen solver. Where kenken.py answers one box at a time, this takes
+# an entire puzzle (the board size plus every box with its cells, operator, and target) and
+# returns the filled-in grid. It leans on the enumerators in kenken.py (iterPlacements, which
+# knows where each box's cells sit) to figure out what each box could hold, and then does the
+# row/column reasoning that we'd otherwise have to do by hand.
+
+# Imports
+import json
+import time
+import kenken
+
+# A quick note on representation, since it's used everywhere below. Cells are numbered
+# row-major, so on an NxN board the cell at (row, col) is row * N + col. Each cell's domain
+# (the numbers it could still hold) is a single int used as a bitmask: bit v - 1 is set if
+# the value v is still possible. So on a 5x5 board, an untouched cell is 0b11111, and a cell
+# that can only be a 2 or a 4 is 0b01010.
+
+
+##### BIT HELPERS #####
+def valueBit(value):
+    '''
+    Returns the domain bit for a single value (e.g., 3 -> 0b100).
+    '''
+    return 1 << (value - 1)
+
+
+def bitValues(mask):
+    '''
+    Returns the values present in a domain bitmask, in ascending order (e.g., 0b1010 ->
+    [2, 4]).
+    '''
+    values = list()
+    value = 1
+
+    while mask:
+        if mask & 1:
+            values.append(value)
+        mask >>= 1
+        value += 1
+
+    return values
+
+
+##### SOLVER #####
+class Solver():
+    '''
+    Constraint-propagation solver for a whole KenKen board.
+
+    Give it the board size and a list of boxes, each as (operator, outputVal, cells), where
+    cells is a list of (row, col) pairs counted from zero. For example, the top-left "8+"
+    box from the help screen would be ('+', 8, [(0, 0), (0, 1), (0, 2)]).
+
+    A box can also carry its fills as a fourth item, e.g. a kenken.PackedSolutionSet, when
+    they've already been worked out; each fill has to list its numbers in the same order as
+    the box's cells.
+
+    Every box's possible fills are worked out once up front. After that, solving alternates
+    between narrowing things down (box fills that no longer fit the cell domains get thrown
+    out, fixed numbers get removed from their row and column, and a number with only one
+    possible home in a row or column gets put there) and guessing on whichever cell has the
+    fewest options left when the narrowing runs dry.
+
+    Pass a SolveStats as stats to have the solve instrumented (see SolveStats); without one,
+    none of that bookkeeping happens.
+    '''
+    def __init__(self, size, cages, stats = None):
+        '''
+        Constructor for Solver. Checks the boxes actually tile the board and precomputes
+        each box's fills.
+        '''
+        self.size = size
+        self.stats = stats
+        self.full = (1 << size) - 1
+
+        numCells = size * size
+        self.cellCage = [-1] * numCells
+        self.cageCells = list()
+        self.cageFills = list()
+        self.cageMasks = list()
+
+        if stats is not None:
+            cacheBefore = kenken.enumCacheInfo()
+
+        for c, cage in enumerate(cages):
+            operator, outputVal, cells = cage[:3]
+            if stats is not None:
+                start = time.perf_counter()
+
+            if not cells:
+                raise ValueError(f"Box {c} has no cells.")
+
+            for row, col in cells:
+                if not (0 <= row < size and 0 <= col < size):
+                    raise ValueError(f"Box {c} has cell ({row}, {col}) outside the board.")
+                if self.cellCage[row * size + col] != -1:
+                    raise ValueError(f"Cell ({row}, {col}) is in more than one box.")
+                self.cellCage[row * size + col] = c
+
+            # Store the fills as bit patterns rather than values so that checking them
+            # against the domains is a plain bitwise AND, along with kenken.fillMasks for
+            # them, which is what the box rule actually works from.
+            if len(cage) > 3:
+                if any(len(f) != len(cells) for f in cage[3]):
+                    raise ValueError(f"Box {c} has a fill that doesn't match its cells.")
+                fills = tuple(tuple(valueBit(v) for v in f) for f in cage[3])
+                masks = kenken.fillMasks(fills, size)
+            else:
+                fills, masks = kenken.memoPlacementBits(operator, outputVal, size, cells)
+
+            self.cageCells.append([row * size + col for row, col in cells])
+            self.cageFills.append(fills)
+            self.cageMasks.append(masks)
+
+            if stats is not None:
+                stats.addCage(operator, outputVal, len(cells), len(self.cageFills[c]),
+                              time.perf_counter() - start)
+
+        if -1 in self.cellCage:
+            missing = self.cellCage.index(-1)
+            raise ValueError(f"Cell ({missing // size}, {missing % size}) is not in any box.")
+
+        # Each cell starts out as whatever its box's fills can put there. The box rule
+        # relies on this: a cell's domain never holds a number none of the box's remaining
+        # fills have there, so a pass that drops no fills can't narrow anything.
+        self.startDomains = [0] * numCells
+        for cells, masks in zip(self.cageCells, self.cageMasks):
+            for cell, byValue in zip(cells, masks):
+                self.startDomains[cell] = sum(valueBit(v) for v in range(1, size + 1) \
+                                              if byValue[v])
+
+        if stats is not None:
+            stats.addEnumeration(cacheBefore, kenken.enumCacheInfo())
+
+        # Units are the rows and columns; every cell belongs to exactly one of each.
+        self.units = [[r * size + c for c in range(size)] for r in range(size)] + \
+                     [[r * size + c for r in range(size)] for c in range(size)]
+        self.cellUnits = [(i // size, size + i % size) for i in range(numCells)]
+
+        # Search statistics for the most recent solve.
+        self.nodes = 0
+        self.backtracks = 0
+
+
+    def _narrow(self, domains, cell, mask, dirtyCages, dirtyUnits):
+        '''
+        Restricts a cell's domain to mask. Returns False if that leaves it empty. Anything
+        that depends on the cell gets flagged for another look.
+        '''
+        newMask = domains[cell] & mask
+        if newMask == domains[cell]:
+            return True
+        if not newMask:
+            return False
+
+        domains[cell] = newMask
+        dirtyCages.add(self.cellCage[cell])
+        dirtyUnits.update(self.cellUnits[cell])
+        return True
+
+
+    def _propagate(self, domains, alive, dirtyCages, dirtyUnits):
+        '''
+        Narrows domains and box fills (both modified in place) until nothing else changes.
+        Returns False on a contradiction. The fills still in play for box c are kept in
+        alive[c], as an int with bit k set if self.cageFills[c][k] is one of them.
+        '''
+        cageCells = self.cageCells
+        cageMasks = self.cageMasks
+        units = self.units
+        stats = self.stats
+
+        while dirtyCages or dirtyUnits:
+            if stats is not None:
+                stats.propagationRounds += 1
+
+            # Box rule: keep only the fills that still fit, then shrink each cell down to
+            # what those survivors can put there. Both only take an AND per number left in
+            # each cell, however many fills the box has.
+            while dirtyCages:
+                c = dirtyCages.pop()
+                cells = cageCells[c]
+                masks = cageMasks[c]
+
+                if stats is not None:
+                    start = time.perf_counter()
+                survivors = alive[c]
+                for position, cell in enumerate(cells):
+                    fits = 0
+                    d = domains[cell]
+                    while d:
+                        low = d & -d
+                        fits |= masks[position][low.bit_length()]
+                        d ^= low
+                    survivors &= fits
+                if stats is not None:
+                    stats.cageFiltered(c, alive[c].bit_count() - survivors.bit_count(),
+                                       time.perf_counter() - start)
+                if not survivors:
+                    return False
+                if survivors == alive[c]:
+                    continue # every cell already fits inside what the fills allow
+                alive[c] = survivors
+
+                for position, cell in enumerate(cells):
+                    union = 0
+                    d = domains[cell]
+                    while d:
+                        low = d & -d
+                        if survivors & masks[position][low.bit_length()]:
+                            union |= low
+                        d ^= low
+                    if not self._narrow(domains, cell, union, dirtyCages, dirtyUnits):
+                        return False
+
+            # Row/column rules.
+            while dirtyUnits and not dirtyCages:
+                unit = units[dirtyUnits.pop()]
+
+                # A fixed number can't appear anywhere else in its row or column.
+                for cell in unit:
+                    d = domains[cell]
+                    if d & (d - 1) == 0:
+                        for other in unit:
+                            if other != cell and domains[other] & d:
+                                if not self._narrow(domains, other, ~d, dirtyCages,
+                                                    dirtyUnits):
+                                    return False
+
+                # Every number has to go somewhere. If it only has one possible home, it
+                # goes there; if it has none, we've gone wrong.
+                seenOnce = 0
+                seenTwice = 0
+                for cell in unit:
+                    d = domains[cell]
+                    seenTwice |= seenOnce & d
+                    seenOnce |= d
+                if seenOnce != self.full:
+                    return False
+
+                hidden = seenOnce & ~seenTwice
+                if hidden:
+                    for cell in unit:
+                        d = domains[cell] & hidden
+                        if d and d != domains[cell]:
+                            if d & (d - 1):
+                                return False # two numbers that both need this one cell
+                            if not self._narrow(domains, cell, d, dirtyCages, dirtyUnits):
+                                return False
+
+        return True
+
+
+    def solutions(self):
+        '''
+        Generator yielding each solution as a list of rows. Most callers only want the first
+        one (see solvePuzzle), but pulling a second is how you check for uniqueness.
+        '''
+        self.nodes = 0
+        self.backtracks = 0
+
+        numCells = self.size * self.size
+        domains = list(self.startDomains)
+        alive = [(1 << len(fills)) - 1 for fills in self.cageFills]
+
+        if not self._propagate(domains, alive, set(range(len(alive))),
+                               set(range(len(self.units)))):
+            if self.stats is not None:
+                self.stats.searched(self)
+            return
+
+        # Depth-first search with an explicit stack, so big boards can't hit the recursion
+        # limit. Each entry is a state that has already been propagated.
+        stack = [(domains, alive)]
+        while stack:
+            domains, alive = stack.pop()
+            self.nodes += 1
+
+            # Guess on the open cell with the fewest options left.
+            best = -1
+            bestCount = self.size + 1
+            for cell in range(numCells):
+                count = domains[cell].bit_count()
+                if 1 < count < bestCount:
+                    best = cell
+                    bestCount = count
+                    if count == 2:
+                        break
+
+            if best == -1:
+                if self.stats is not None:
+                    self.stats.searched(self)
+                yield [[domains[r * self.size + c].bit_length() for c in range(self.size)]
+                       for r in range(self.size)]
+                continue
+
+            # Push in reverse so the smallest value gets tried first.
+            for value in reversed(bitValues(domains[best])):
+                childDomains = domains.copy()
+                childAlive = alive.copy()
+                childDomains[best] = valueBit(value)
+
+                if self._propagate(childDomains, childAlive, {self.cellCage[best]},
+                                   set(self.cellUnits[best])):
+                    stack.append((childDomains, childAlive))
+                else:
+                    self.backtracks += 1
+
+        if self.stats is not None:
+            self.stats.searched(self)
+
+
+##### DANCING LINKS #####
+class DancingLinksSolver(Solver):
+    '''
+    The same puzzles, solved as an exact cover problem with Knuth's Algorithm X and dancing
+    links instead of propagation.
+
+    Every fill of every box is one option. An option covers its box, plus "row r has a v"
+    and "column c has a v" for each of its cells, and a solution is a set of options
+    covering every one of those exactly once: each box filled once, and every number once
+    per row and column. Taking the next step on whichever item has the fewest options left
+    does a lot of the same reasoning Solver does by hand, without the bookkeeping, which
+    tends to pay off on big boards full of loose boxes where Solver ends up guessing a lot.
+
+    Takes the same arguments as Solver (it reuses Solver's checks and box fills) and gives
+    the same solutions() generator, nodes, and backtracks.
+    '''
+    def solutions(self):
+        '''
+        Generator yielding each solution as a list of rows, like Solver.solutions.
+        '''
+        self.nodes = 0
+        self.backtracks = 0
+
+        size = self.size
+        numCages = len(self.cageCells)
+
+        # Items: boxes first, then (row, value) pairs, then (column, value) pairs. Node 0 is
+        # the root, nodes 1 to numItems are the item headers, and every option's nodes come
+        # after that. The links are plain lists of node numbers rather than objects, which
+        # is a good deal quicker in Python.
+        numItems = numCages + 2 * size * size
+        L = [i - 1 for i in range(numItems + 1)]
+        R = [i + 1 for i in range(numItems + 1)]
+        L[0] = numItems
+        R[numItems] = 0
+        U = list(range(numItems + 1))
+        D = list(range(numItems + 1))
+        C = list(range(numItems + 1))
+        S = [0] * (numItems + 1)
+        O = [-1] * (numItems + 1) # which option each node belongs to
+
+        options = list()
+        for c, cells in enumerate(self.cageCells):
+            for f in self.cageFills[c]:
+                items = [1 + c]
+                for cell, b in zip(cells, f):
+                    v = b.bit_length() - 1
+                    items.append(1 + numCages + (cell // size) * size + v)
+                    items.append(1 + numCages + size * size + (cell % size) * size + v)
+
+                first = len(C)
+                for k, item in enumerate(items):
+                    node = first + k
+                    L.append(node - 1 if k else first + len(items) - 1)
+                    R.append(node + 1 if k < len(items) - 1 else first)
+                    U.append(U[item])
+                    D.append(item)
+                    D[U[item]] = node
+                    U[item] = node
+                    C.append(item)
+                    O.append(len(options))
+                    S[item] += 1
+                options.append((cells, f))
+
+        def cover(c):
+            L[R[c]] = L[c]
+            R[L[c]] = R[c]
+            i = D[c]
+            while i != c:
+                j = R[i]
+                while j != i:
+                    U[D[j]] = U[j]
+                    D[U[j]] = D[j]
+                    S[C[j]] -= 1
+                    j = R[j]
+                i = D[i]
+
+        def uncover(c):
+            i = U[c]
+            while i != c:
+                j = L[i]
+                while j != i:
+                    S[C[j]] += 1
+                    U[D[j]] = j
+                    D[U[j]] = j
+                    j = L[j]
+                i = U[i]
+            L[R[c]] = c
+            R[L[c]] = c
+
+        def select(r):
+            j = R[r]
+            while j != r:
+                cover(C[j])
+                j = R[j]
+
+        def unselect(r):
+            j = L[r]
+            while j != r:
+                uncover(C[j])
+                j = L[j]
+
+        # Algorithm X with an explicit stack of [item, option node being tried] pairs, so
+        # big boards can't hit the recursion limit.
+        stack = list()
+        descend = True
+        while True:
+            if descend:
+                self.nodes += 1
+                if R[0] == 0:
+                    grid = [[0] * size for _ in range(size)]
+                    for _, r in stack:
+                        for cell, b in zip(*options[O[r]]):
+                            grid[cell // size][cell % size] = b.bit_length()
+                    if self.stats is not None:
+                        self.stats.searched(self)
+                    yield grid
+                    descend = False
+                else:
+                    # Branch on the item with the fewest options left.
+                    best = R[0]
+                    j = R[best]
+                    while j and S[best] > 1:
+                        if S[j] < S[best]:
+                            best = j
+                        j = R[j]
+
+                    if S[best] == 0:
+                        self.backtracks += 1
+                        descend = False
+                    else:
+                        cover(best)
+                        r = D[best]
+                        select(r)
+                        stack.append([best, r])
+                        continue
+
+            # Back up to the deepest item with another option left to try.
+            while stack:
+                entry = stack[-1]
+                c, r = entry
+                unselect(r)
+                r = D[r]
+                if r != c:
+                    entry[1] = r
+                    select(r)
+                    descend = True
+                    break
+                uncover(c)
+                stack.pop()
+            else:
+                if self.stats is not None:
+                    self.stats.searched(self)
+                return
+
+
+##### INSTRUMENTATION #####
+class SolveStats():
+    '''
+    Counters for one solve, for finding out why a puzzle is slow without reaching for a
+    profiler. Hand one to a solver and read it (or dump it with toJson) afterwards:
+
+        stats = SolveStats()
+        solution = solvePuzzle(size, cages, stats = stats)
+        print(stats.toJson())
+
+    What gets counted:
+
+        enumerators         for each memoized enumerator in kenken.py, how many times it was
+                            called while the boxes were being set up and how many of those
+                            were cache hits (misses are real enumerations)
+        nodes, backtracks   the solver's search counts
+        propagationRounds   passes through the propagation loop (Solver only)
+        cages               per box: its clue, size, number of fills, the seconds spent
+                            enumerating them, and how often, how long, and how many fills
+                            were thrown out filtering it during propagation
+
+    A solver without a SolveStats skips all of this, so it's safe to leave the hooks in.
+    '''
+    def __init__(self):
+        '''
+        Constructor for SolveStats. Everything starts at zero.
+        '''
+        self.enumerators = dict()
+        self.nodes = 0
+        self.backtracks = 0
+        self.propagationRounds = 0
+        self.cages = list()
+
+
+    def addCage(self, operator, outputVal, boxSize, fills, seconds):
+        '''
+        Records a box as the solver sets it up.
+        '''
+        self.cages.append({'operator': operator, 'target': outputVal, 'cells': boxSize,
+                           'fills': fills, 'enumerateSeconds': seconds, 'filters': 0,
+                           'fillsRemoved': 0, 'filterSeconds': 0.0})
+
+
+    def addEnumeration(self, before, after):
+        '''
+        Records the enumerator calls made between two kenken.enumCacheInfo() snapshots.
+        '''
+        for name, (hits, misses) in after.items():
+            oldHits, oldMisses = before.get(name, (0, 0))
+            calls = hits + misses - oldHits - oldMisses
+            if calls:
+                counts = self.enumerators.setdefault(name, {'calls': 0, 'hits': 0})
+                counts['calls'] += calls
+                counts['hits'] += hits - oldHits
+
+
+    def cageFiltered(self, c, removed, seconds):
+        '''
+        Records one pass of the box rule over box c.
+        '''
+        cage = self.cages[c]
+        cage['filters'] += 1
+        cage['fillsRemoved'] += removed
+        cage['filterSeconds'] += seconds
+
+
+    def searched(self, solver):
+        '''
+        Copies the search counts off a solver.
+        '''
+        self.nodes = solver.nodes
+        self.backtracks = solver.backtracks
+
+
+    def slowestCages(self, count = 5):
+        '''
+        The indexes of the count boxes that took the most time, enumerating and filtering
+        together, slowest first.
+        '''
+        total = lambda c: self.cages[c]['enumerateSeconds'] + self.cages[c]['filterSeconds']
+        return sorted(range(len(self.cages)), key = total, reverse = True)[:count]
+
+
+    def asDict(self):
+        '''
+        Everything as a plain dictionary (ready for json.dumps).
+        '''
+        return {'enumerators': self.enumerators, 'nodes': self.nodes,
+                'backtracks': self.backtracks, 'propagationRounds': self.propagationRounds,
+                'cages': self.cages}
+
+
+    def toJson(self):
+        '''
+        Everything as one line of JSON, for logs.
+        '''
+        return json.dumps(self.asDict(), separators = (',', ':'))
+
+
+# Solving engines by name, for anything that wants to pick one per call.
+ENGINES = {'propagate': Solver, 'dlx': DancingLinksSolver}
+
+
+def solvePuzzle(size, cages, engine = 'propagate', stats = None):
+    '''
+    Solves a whole puzzle. See Solver for the format of cages. Returns the solved grid as a
+    list of rows, or None if the puzzle has no solution. engine picks the solver: 'propagate'
+    (Solver, the default) or 'dlx' (DancingLinksSolver). stats is an optional SolveStats to
+    fill in.
+    '''
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine '{engine}' (expected one of {', '.join(ENGINES)}).")
+
+    return next(ENGINES[engine](size, cages, stats).solutions(), None)
+
+
+##### PUZZLE TEXT FORMAT #####
+# Puzzles can be written one per line, which makes big collections of them easy to store and
+# stream. A line looks like:
+#
+#     [name] size box;box;box;...
+#
+# where each box is its target and operator, a colon, and its cells as row-major numbers
+# (row * size + col) separated by commas. Single-cell boxes can leave out the operator or use
+# '='. For example, a 3x3 puzzle:
+#
+#     tiny 3 3/:0,1;1-:2,5;6*:3,4,7;2:6;1:8
+#
+# The name is optional; blank lines and lines starting with '#' are ignored by the readers.
+
+def parsePuzzle(line):
+    '''
+    Parses one line of puzzle text. Returns (name, size, cages), with name None if the line
+    didn't give one and cages in the format Solver expects. Raises ValueError on a line that
+    doesn't follow the format.
+    '''
+    fields = line.split()
+    if len(fields) == 3:
+        name, sizeText, boxesText = fields
+    elif len(fields) == 2:
+        name = None
+        sizeText, boxesText = fields
+    else:
+        raise ValueError(f"Expected '[name] size boxes', got {len(fields)} fields.")
+
+    size = int(sizeText)
+    cages = list()
+
+    for box in boxesText.split(';'):
+        clue, _, cellsText = box.partition(':')
+        if not cellsText:
+            raise ValueError(f"Box '{box}' has no cells.")
+
+        if clue[-1:] in ('+', '-', '*', '/', '='):
+            operator, target = clue[-1], clue[:-1]
+        else:
+            operator, target = '=', clue
+
+        cells = [divmod(int(c), size) for c in cellsText.split(',')]
+        cages.append((operator, int(target), cells))
+
+    return name, size, cages
+
+
+def formatPuzzle(size, cages, name = None):
+    '''
+    The reverse of parsePuzzle: writes a puzzle out as one line of text.
+    '''
+    boxes = list()
+    for operator, outputVal, cells in cages:
+        clue = str(outputVal) + ('' if operator == '=' or len(cells) == 1 else operator)
+        boxes.append(clue + ':' + ','.join(str(row * size + col) for row, col in cells))
+
+    line = f"{size} {';'.join(boxes)}"
+    return line if name is None else f"{name} {line}"